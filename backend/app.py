@@ -1,10 +1,17 @@
 from flask import Flask, jsonify, request
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 import uuid
 from flask_cors import CORS
-from app.database import init_db, create_user, get_user_by_email, create_event, get_events_by_user, get_event_by_id, update_event, delete_event
+from app.database import init_db, create_user, get_user_by_email, create_event, get_events_by_user, get_event_by_id, update_event, delete_event, count_tasks
+from app.events import get_events_in_window
+from app.tasks import create_new_task, get_single_task, get_tasks_by_id_list, get_user_tasks, get_next_tasks, modify_task, remove_task
 from app.auth import hash_password, verify_password, generate_token, verify_token
+from app.conflicts import event_interval, MAX_EVENT_SPAN
+from app.serialization import MongoJSONEncoder
+from app.compression import init_compression
+from app.scheduler import schedule_tasks, DEFAULT_WORKING_HOURS, DEFAULT_TIME_BUDGET_MS, MAX_HORIZON_DAYS
+from bson import ObjectId
 import os
 from dotenv import load_dotenv
 
@@ -13,7 +20,9 @@ load_dotenv()
 
 # Initialize Flask app
 app = Flask(__name__)
+app.json_encoder = MongoJSONEncoder
 CORS(app)
+init_compression(app)
 
 # Initialize database
 init_db()
@@ -31,9 +40,8 @@ def add_cors_headers(response):
 def options_handler(path):
     return jsonify({}), 200
 
-# In-memory data storage
+# In-memory data storage (tasks are stored in MongoDB, see app/tasks.py)
 events = []
-tasks = []
 users = []
 
 # Create sample data
@@ -52,16 +60,14 @@ def create_sample_data():
         })
         print("Added sample event")
     
-    if not tasks:
-        tasks.append({
-            "id": str(uuid.uuid4()),
+    if not count_tasks():
+        create_new_task(None, {
             "task_name": "Complete Backend API",
             "description": "Implement all REST endpoints for the scheduling app",
             "due_date": "2025-04-20",
             "priority": 1,  # High priority
             "status": "in-progress",
-            "tags": ["development", "backend"],
-            "created_at": datetime.utcnow().isoformat()
+            "tags": ["development", "backend"]
         })
         print("Added sample task")
     
@@ -104,11 +110,6 @@ def get_events():
     # Get events
     events = get_events_by_user(user_id, start_date, end_date)
     
-    # Convert ObjectId to string for JSON serialization
-    for event in events:
-        event['_id'] = str(event['_id'])
-        event['user_id'] = str(event['user_id'])
-    
     return jsonify(events)
 
 @app.route('/api/events', methods=['POST'])
@@ -148,10 +149,6 @@ def add_event():
     
     event = create_event(event_data)
     
-    # Convert ObjectId to string for JSON serialization
-    event['_id'] = str(event['_id'])
-    event['user_id'] = str(event['user_id'])
-    
     return jsonify(event), 201
 
 @app.route('/api/events/<event_id>', methods=['GET'])
@@ -177,10 +174,6 @@ def get_event(event_id):
     if str(event['user_id']) != user_id:
         return jsonify({'error': 'Unauthorized'}), 403
     
-    # Convert ObjectId to string for JSON serialization
-    event['_id'] = str(event['_id'])
-    event['user_id'] = str(event['user_id'])
-    
     return jsonify(event)
 
 @app.route('/api/events/<event_id>', methods=['PUT'])
@@ -218,10 +211,6 @@ def update_event_route(event_id):
     # Get updated event
     updated_event = get_event_by_id(event_id)
     
-    # Convert ObjectId to string for JSON serialization
-    updated_event['_id'] = str(updated_event['_id'])
-    updated_event['user_id'] = str(updated_event['user_id'])
-    
     return jsonify(updated_event)
 
 @app.route('/api/events/<event_id>', methods=['DELETE'])
@@ -256,28 +245,58 @@ def delete_event_route(event_id):
     return jsonify({'message': 'Event deleted successfully'})
 
 # Tasks API
+def get_request_user_id():
+    """Return (user_id, error_response). Tasks sent without a token belong to no user."""
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None, None
+    
+    user_id = verify_token(auth_header.split(' ')[1])
+    if not user_id:
+        return None, (jsonify({'error': 'Invalid token'}), 401)
+    return user_id, None
+
 @app.route('/api/tasks', methods=['GET'])
 def get_tasks():
+    user_id, error = get_request_user_id()
+    if error:
+        return error
+    
     # Optional filter by priority
     priority = request.args.get('priority')
     if priority:
         try:
             priority = int(priority)
-            filtered_tasks = [t for t in tasks if t['priority'] == priority]
-            return jsonify(filtered_tasks)
         except ValueError:
             return jsonify({"error": "Priority must be a number"}), 400
     
     # Optional filter by status
     status = request.args.get('status')
-    if status:
-        filtered_tasks = [t for t in tasks if t['status'] == status]
-        return jsonify(filtered_tasks)
     
-    return jsonify(tasks)
+    return jsonify(get_user_tasks(user_id, status or None, priority or None))
+
+@app.route('/api/tasks/next', methods=['GET'])
+def get_next():
+    user_id, error = get_request_user_id()
+    if error:
+        return error
+    
+    # How many tasks to suggest
+    try:
+        k = int(request.args.get('k', 5))
+    except ValueError:
+        return jsonify({"error": "k must be a number"}), 400
+    if k < 1:
+        return jsonify({"error": "k must be positive"}), 400
+    
+    return jsonify([dict(task, score=round(score, 2)) for score, task in get_next_tasks(user_id, k)])
 
 @app.route('/api/tasks', methods=['POST'])
 def create_task():
+    user_id, error = get_request_user_id()
+    if error:
+        return error
+    
     data = request.get_json()
     
     # Validate required fields
@@ -285,53 +304,46 @@ def create_task():
         return jsonify({"error": "Task name is required"}), 400
     
     # Create new task
-    new_task = {
-        "id": str(uuid.uuid4()),
-        "task_name": data['task_name'],
-        "description": data.get('description', ''),
-        "due_date": data.get('due_date'),
-        "priority": data.get('priority', 3),  # Default medium priority
-        "status": data.get('status', 'pending'),
-        "tags": data.get('tags', []),
-        "created_at": datetime.now().isoformat()
-    }
-    
-    tasks.append(new_task)
+    new_task = create_new_task(user_id, data)
     return jsonify(new_task), 201
 
 @app.route('/api/tasks/<task_id>', methods=['GET'])
 def get_task(task_id):
-    task = next((t for t in tasks if t['id'] == task_id), None)
-    if task:
+    user_id, error = get_request_user_id()
+    if error:
+        return error
+    
+    task = get_single_task(task_id)
+    if task and task.get('user_id') == user_id:
         return jsonify(task)
     return jsonify({"error": "Task not found"}), 404
 
 @app.route('/api/tasks/<task_id>', methods=['PUT'])
 def update_task(task_id):
+    user_id, error = get_request_user_id()
+    if error:
+        return error
+    
     data = request.get_json()
-    task = next((t for t in tasks if t['id'] == task_id), None)
+    task = get_single_task(task_id)
     
-    if not task:
+    if not task or task.get('user_id') != user_id:
         return jsonify({"error": "Task not found"}), 404
     
-    # Update task fields
-    for key in data:
-        if key != 'id' and key != 'created_at':  # Don't allow changing id or creation timestamp
-            task[key] = data[key]
-    
-    # Add completion timestamp if task is marked as completed
-    if data.get('status') == 'completed' and task['status'] != 'completed':
-        task['completed_at'] = datetime.now().isoformat()
+    task = modify_task(task_id, data or {})
+    if not task:
+        return jsonify({"error": "Task not found"}), 404
     
     return jsonify(task)
 
 @app.route('/api/tasks/<task_id>', methods=['DELETE'])
 def delete_task(task_id):
-    global tasks
-    initial_length = len(tasks)
-    tasks = [t for t in tasks if t['id'] != task_id]
+    user_id, error = get_request_user_id()
+    if error:
+        return error
     
-    if len(tasks) < initial_length:
+    task = get_single_task(task_id)
+    if task and task.get('user_id') == user_id and remove_task(task_id):
         return jsonify({"message": "Task deleted successfully"})
     return jsonify({"error": "Task not found"}), 404
 
@@ -404,29 +416,47 @@ def get_schedule_suggestions():
     if not data or not 'tasks' in data:
         return jsonify({"error": "Please provide tasks to schedule"}), 400
     
+    user_id, error = get_request_user_id()
+    if error:
+        return error
+    
     # Get tasks to schedule (either IDs or task objects)
     tasks_to_schedule = []
     
-    # If task IDs are provided
+    # If task IDs are provided, only the caller's own tasks are used
     if all(isinstance(t, str) for t in data['tasks']):
-        for task_id in data['tasks']:
-            task = next((t for t in tasks if t['id'] == task_id), None)
-            if task:
-                tasks_to_schedule.append(task)
+        tasks_to_schedule = get_tasks_by_id_list(data['tasks'], user_id)
     else:
         tasks_to_schedule = data['tasks']
     
-    # Sort tasks by priority and due date
-    def get_sort_key(task):
-        priority = task.get('priority', 3)
-        due_date = task.get('due_date', '9999-12-31')  # Default far future date
-        return (priority, due_date)
-    
-    sorted_tasks = sorted(tasks_to_schedule, key=get_sort_key)
+    # Time that is already taken, either passed in or read from the user's calendar
+    busy = [(b['start'], b['end']) for b in data.get('busy', [])]
+    
+    try:
+        if user_id:
+            # Only the events that can overlap the planning horizon
+            window_start = datetime.fromisoformat(data['start']) if data.get('start') else datetime.now()
+            window_end = window_start + timedelta(days=MAX_HORIZON_DAYS)
+            for event in get_events_in_window(ObjectId(user_id), window_start - MAX_EVENT_SPAN, window_end):
+                try:
+                    busy.append(event_interval(event))
+                except (KeyError, TypeError, ValueError):
+                    continue
+        
+        result = schedule_tasks(
+            tasks_to_schedule,
+            busy,
+            start=data.get('start'),
+            working_hours=data.get('working_hours', DEFAULT_WORKING_HOURS),
+            time_budget_ms=data.get('time_budget_ms', DEFAULT_TIME_BUDGET_MS)
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid scheduling input: {str(e)}"}), 400
     
     return jsonify({
-        "suggested_schedule": sorted_tasks,
-        "scheduling_notes": "Tasks are arranged by priority (highest first) and then by due date."
+        "suggested_schedule": result['scheduled'],
+        "unscheduled": result['unscheduled'],
+        "scheduling_notes": "Tasks are placed, highest priority first, into the earliest free working time before their due date."
     })
 
 if __name__ == '__main__':
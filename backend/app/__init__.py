@@ -2,15 +2,23 @@ from flask import Flask
 from flask_cors import CORS
 import os
 from .database import init_db
+from .hashing import hasher
+from .metrics import init_metrics
+from .serialization import MongoJSONEncoder
+from .compression import init_compression
 
 def create_app():
     app = Flask(__name__)
     
+    # ObjectIds and datetimes are encoded by jsonify itself
+    app.json_encoder = MongoJSONEncoder
+    
     # Configure CORS - more permissive for development
     CORS(app, 
          resources={r"/api/*": {"origins": "*"}},
          supports_credentials=True,
          allow_headers=["Content-Type", "Authorization"],
+         expose_headers=["X-Next-Cursor"],
          methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
     
     # Configure upload folder
@@ -24,8 +32,18 @@ def create_app():
     with app.app_context():
         init_db()
     
+    # Pick a bcrypt cost that suits this machine
+    rounds = hasher.calibrate()
+    print(f"Using bcrypt cost factor {rounds}")
+    
     # Register blueprints
     from .routes import main
     app.register_blueprint(main)
     
+    # Request timings and the /metrics endpoint
+    init_metrics(app)
+    
+    # gzip/zstd/brotli for JSON and export responses
+    init_compression(app)
+    
     return app 
\ No newline at end of file
@@ -1,9 +1,15 @@
 import jwt
-import bcrypt
-from datetime import datetime, timedelta
+import hashlib
+import uuid
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 import os
 from dotenv import load_dotenv
-from .database import get_user_by_email, create_user
+from .database import get_user_by_email, create_user, add_revoked_token, get_revoked_tokens_since
+from .cache import LRUCache
+from .hashing import hasher
+from .metrics import observe, JWT_SECONDS
 from functools import wraps
 from flask import request, jsonify
 from bson.objectid import ObjectId
@@ -16,65 +22,201 @@ JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key')
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_DELTA = timedelta(days=1)
 
+# EventSource cannot send headers, so the stream is opened with a ticket in the
+# query string instead of the login token. A ticket is only good for opening a
+# stream, and only for this long, so one that ends up in an access log is useless.
+STREAM_TICKET_SECONDS = 60
+
+# Verified tokens are remembered until they expire, so hot routes skip the
+# signature check. Keyed by a digest so raw tokens are never kept in memory.
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', '10000'))
+_token_cache = LRUCache(TOKEN_CACHE_SIZE, 0)
+
+# Local mirror of the shared denylist, refreshed from MongoDB this often
+REVOCATION_SYNC_SECONDS = 5
+_revoked = {}  # token digest -> exp timestamp
+_revoked_lock = threading.Lock()
+# `latest` is the newest revoked_at seen so far; it comes from the database
+# server's clock, so this host's clock never decides what counts as new
+_last_sync = {'checked': 0.0, 'latest': datetime.utcfromtimestamp(0)}
+
+class TokenRevoked(jwt.InvalidTokenError):
+    """The token was revoked before it expired."""
+
+def _token_digest(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def _sync_revocations():
+    """Pull revocations made by other processes, at most every few seconds."""
+    now = time.monotonic()
+    if now - _last_sync['checked'] < REVOCATION_SYNC_SECONDS:
+        return
+    _last_sync['checked'] = now
+    try:
+        # Overlap slightly so entries committed just behind the newest one aren't missed
+        since = _last_sync['latest'] - timedelta(seconds=REVOCATION_SYNC_SECONDS)
+        entries = get_revoked_tokens_since(since)
+    except Exception as e:
+        print(f"Error syncing revoked tokens: {str(e)}")  # Add logging
+        return
+    cutoff = time.time()
+    with _revoked_lock:
+        for entry in entries:
+            _revoked[entry['_id']] = entry['expires_at'].replace(tzinfo=timezone.utc).timestamp()
+            _token_cache.pop(entry['_id'])
+            # Only move on past what was actually fetched
+            if entry['revoked_at'] > _last_sync['latest']:
+                _last_sync['latest'] = entry['revoked_at']
+        # Entries past their expiry no longer matter
+        for digest in [d for d, exp in _revoked.items() if exp < cutoff]:
+            del _revoked[digest]
+
+def decode_token(token):
+    """Verify a JWT and return its payload, using the verified-token cache.
+
+    Raises jwt.ExpiredSignatureError, TokenRevoked or jwt.InvalidTokenError.
+    """
+    started_at = time.perf_counter()
+    digest = _token_digest(token)
+    _sync_revocations()
+    if digest in _revoked:
+        raise TokenRevoked('Token has been revoked')
+
+    payload = _token_cache.get(digest)
+    if payload is not None:
+        observe(JWT_SECONDS, time.perf_counter() - started_at, 'hit')
+    else:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        # Stream tickets are not API tokens
+        if 'scope' in payload:
+            raise jwt.InvalidTokenError('Not an API token')
+        # Convert the user ID once per token rather than once per request
+        try:
+            payload['user_oid'] = ObjectId(payload['user_id'])
+        except Exception:
+            payload['user_oid'] = None
+        ttl = payload['exp'] - time.time()
+        if ttl > 0:
+            _token_cache.set(digest, payload, ttl)
+        observe(JWT_SECONDS, time.perf_counter() - started_at, 'miss')
+    return payload
+
+def revoke_token(token):
+    """Revoke a token for every process until it would have expired."""
+    payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    digest = _token_digest(token)
+    add_revoked_token(digest, datetime.utcfromtimestamp(payload['exp']))
+    with _revoked_lock:
+        _revoked[digest] = payload['exp']
+    _token_cache.pop(digest)
+
+def generate_stream_ticket(token):
+    """Short-lived ticket for opening the event stream, tied to a verified login token."""
+    payload = decode_token(token)
+    ticket = {
+        'user_id': payload['user_id'],
+        'scope': 'stream',
+        # The login token the stream lives on: its digest and when it expires
+        'sid': _token_digest(token),
+        'session_exp': payload['exp'],
+        'exp': datetime.utcnow() + timedelta(seconds=STREAM_TICKET_SECONDS)
+    }
+    return jwt.encode(ticket, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+def stream_session(token=None, ticket=None):
+    """Return (user_id, sid, session_exp) for a login token or a stream ticket.
+
+    Raises jwt.ExpiredSignatureError, TokenRevoked or jwt.InvalidTokenError.
+    """
+    if token:
+        payload = decode_token(token)
+        return payload['user_id'], _token_digest(token), payload['exp']
+    payload = jwt.decode(ticket or '', JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    if payload.get('scope') != 'stream':
+        raise jwt.InvalidTokenError('Not a stream ticket')
+    if not session_active(payload['sid'], payload['session_exp']):
+        raise TokenRevoked('Token has been revoked')
+    return payload['user_id'], payload['sid'], payload['session_exp']
+
+def session_active(sid, session_exp):
+    """True while the login token with this digest is unexpired and not revoked."""
+    if time.time() >= session_exp:
+        return False
+    _sync_revocations()
+    return sid not in _revoked
+
+def get_request_token():
+    """Return the bearer token sent with the current request, if any."""
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        return auth_header.split(' ')[1]
+    return None
+
+def _authenticate(kwargs):
+    """Check the request's token and add user_id to kwargs; returns an error response or None."""
+    # Get token from header
+    token = get_request_token()
+    
+    if not token:
+        return jsonify({'error': 'Token is missing'}), 401
+    
+    try:
+        # Verify token (cached after the first successful check)
+        payload = decode_token(token)
+        user_id = payload['user_oid']
+        
+        if user_id is None:
+            return jsonify({'error': 'Invalid user ID format'}), 401
+        
+        # Add user_id to kwargs
+        kwargs['user_id'] = user_id
+        return None
+    except jwt.ExpiredSignatureError:
+        return jsonify({'error': 'Token has expired'}), 401
+    except TokenRevoked:
+        return jsonify({'error': 'Token has been revoked'}), 401
+    except jwt.InvalidTokenError:
+        return jsonify({'error': 'Invalid token'}), 401
+    except Exception as e:
+        print(f"Error in token_required: {str(e)}")  # Add logging
+        return jsonify({'error': 'Token verification failed'}), 401
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        
-        # Get token from header
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-        
-        if not token:
-            return jsonify({'error': 'Token is missing'}), 401
-        
-        try:
-            # Verify token
-            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-            user_id = payload['user_id']
-            
-            # Convert string user_id to ObjectId if needed
-            if isinstance(user_id, str):
-                try:
-                    user_id = ObjectId(user_id)
-                except:
-                    return jsonify({'error': 'Invalid user ID format'}), 401
-            
-            # Add user_id to kwargs
-            kwargs['user_id'] = user_id
-            return f(*args, **kwargs)
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Invalid token'}), 401
-        except Exception as e:
-            print(f"Error in token_required: {str(e)}")  # Add logging
-            return jsonify({'error': 'Token verification failed'}), 401
+        error = _authenticate(kwargs)
+        if error:
+            return error
+        return f(*args, **kwargs)
     
     return decorated
 
 def hash_password(password):
-    """Hash a password using bcrypt."""
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode('utf-8'), salt)
+    """Hash a password using bcrypt through the bounded hasher. Raises HasherBusy when overloaded."""
+    return hasher.hash(password)
 
 def verify_password(password, password_hash):
-    """Verify a password against its hash."""
-    return bcrypt.checkpw(password.encode('utf-8'), password_hash)
+    """Verify a password against its hash through the bounded hasher. Raises HasherBusy when overloaded."""
+    return hasher.verify(password, password_hash)
+
+def password_needs_rehash(password_hash):
+    """True if the hash was made with a lower cost factor than the current one."""
+    return hasher.needs_rehash(password_hash)
 
 def generate_token(user_id):
     """Generate a JWT token for a user."""
     payload = {
         'user_id': str(user_id),
-        'exp': datetime.utcnow() + JWT_EXPIRATION_DELTA
+        'exp': datetime.utcnow() + JWT_EXPIRATION_DELTA,
+        # Unique per token, so revoking one login never affects another
+        'jti': uuid.uuid4().hex
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 def verify_token(token):
     """Verify a JWT token and return the user ID if valid."""
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        payload = decode_token(token)
         return payload['user_id']
     except jwt.ExpiredSignatureError:
         return None
@@ -0,0 +1,92 @@
+import numpy as np
+from datetime import timedelta
+from .conflicts import event_interval
+
+# Candidate slots start on multiples of this many minutes
+DEFAULT_STEP_MINUTES = 15
+
+# Longest window we will build masks for
+MAX_WINDOW_DAYS = 31
+
+def _minutes(moment, origin):
+    return int((moment - origin).total_seconds() // 60)
+
+def busy_mask(intervals, window_start, window_end):
+    """Return a boolean array with one entry per minute of the window, True when busy."""
+    size = _minutes(window_end, window_start)
+    if not intervals:
+        return np.zeros(size, dtype=bool)
+
+    bounds = np.array(
+        [(_minutes(start, window_start), _minutes(end, window_start)) for start, end in intervals],
+        dtype=np.int64
+    )
+    bounds = np.clip(bounds, 0, size)
+    # Difference array: +1 where an interval opens, -1 where it closes
+    delta = np.zeros(size + 1, dtype=np.int32)
+    np.add.at(delta, bounds[:, 0], 1)
+    np.add.at(delta, bounds[:, 1], -1)
+    return np.cumsum(delta[:size]) > 0
+
+def outside_working_hours(window_start, window_end, working_hours):
+    """Mask of the minutes in the window that fall outside working hours."""
+    open_hour, close_hour = working_hours
+    size = _minutes(window_end, window_start)
+    offset = window_start.hour * 60 + window_start.minute
+    minute_of_day = (np.arange(size) + offset) % (24 * 60)
+    return (minute_of_day < open_hour * 60) | (minute_of_day >= close_hour * 60)
+
+def find_common_slots(busy_masks, window_start, duration, working_hours, count,
+                      step=DEFAULT_STEP_MINUTES):
+    """Return the earliest `count` non-overlapping (start, end) slots free in every mask.
+
+    `busy_masks` is a list of per-participant minute masks for the window that
+    starts at `window_start`.
+    """
+    size = len(busy_masks[0]) if busy_masks else 0
+    if size < duration:
+        return []
+
+    window_end = window_start + timedelta(minutes=size)
+    busy = np.bitwise_or.reduce(np.vstack(busy_masks), axis=0)
+    busy |= outside_working_hours(window_start, window_end, working_hours)
+
+    # A slot starting at minute i fits when the next `duration` minutes are all free
+    free_prefix = np.concatenate(([0], np.cumsum(~busy, dtype=np.int64)))
+    fits = (free_prefix[duration:] - free_prefix[:-duration]) == duration
+
+    # Only offer starts on the step grid, measured from the top of the hour
+    offset = window_start.minute % step
+    first = (step - offset) % step
+    candidates = np.flatnonzero(fits[first::step]) * step + first
+
+    slots = []
+    position = 0
+    while position < len(candidates) and len(slots) < count:
+        start = int(candidates[position])
+        slots.append((window_start + timedelta(minutes=start),
+                      window_start + timedelta(minutes=start + duration)))
+        # Jump to the first candidate that does not overlap this slot
+        position = int(np.searchsorted(candidates, start + duration))
+    return slots
+
+def participant_intervals(events, emails, users_by_id):
+    """Group busy intervals by participant email.
+
+    An event counts against its owner (looked up through `users_by_id`) and
+    against every listed participant.
+    """
+    wanted = set(emails)
+    intervals = {email: [] for email in emails}
+    for event in events:
+        try:
+            interval = event_interval(event)
+        except (KeyError, TypeError, ValueError):
+            continue
+        attendees = {(p.get('email') or '').lower() for p in event.get('participants') or []}
+        owner = users_by_id.get(event.get('user_id'))
+        if owner:
+            attendees.add(owner)
+        for email in attendees & wanted:
+            intervals[email].append(interval)
+    return intervals
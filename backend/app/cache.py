@@ -0,0 +1,59 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from .database import event_version
+
+# Event list responses kept per process, and how long each stays fresh. Keys
+# carry the user's shared event version, so a write made by any worker moves
+# every worker to a fresh key; the TTL only covers a lost version bump.
+EVENT_CACHE_SIZE = int(os.getenv('EVENT_CACHE_SIZE', '1024'))
+EVENT_CACHE_TTL = float(os.getenv('EVENT_CACHE_TTL', '30'))
+
+class LRUCache:
+    """Thread-safe LRU cache whose entries also expire after a TTL."""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl_seconds=None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# Cached GET /api/events responses, keyed on (user, version, window)
+event_cache = LRUCache(EVENT_CACHE_SIZE, EVENT_CACHE_TTL)
+
+def event_cache_key(user_id, *window):
+    """Cache key for a user's events in a window at the current shared version."""
+    return (user_id, event_version(user_id)) + tuple(window)
@@ -0,0 +1,284 @@
+import json
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from bson import ObjectId
+from .events import build_event_document
+from .recurrence import format_rrule
+
+# Events are written to the database in batches of this size
+IMPORT_CHUNK_SIZE = 500
+
+# Only the first errors are reported back, to keep the response small
+MAX_REPORTED_ERRORS = 100
+
+# Documents fetched per round trip when exporting
+EXPORT_BATCH_SIZE = 500
+
+ICS_PRIORITIES = {'high': 1, 'medium': 5, 'low': 9}
+
+# Events are stored as local wall-clock times. Imported UTC and TZID times are
+# converted into this zone (the server's own zone when unset)
+CALENDAR_TZ = os.getenv('CALENDAR_TZ')
+_LOCAL_ZONE = ZoneInfo(CALENDAR_TZ) if CALENDAR_TZ else None
+
+def _ics_priority_name(value):
+    """Map an iCalendar PRIORITY (1 highest .. 9 lowest) to the calendar's names."""
+    priority = int(value)
+    if priority == 0:
+        return 'medium'
+    if priority <= 4:
+        return 'high'
+    if priority == 5:
+        return 'medium'
+    return 'low'
+
+def _lines(stream):
+    """Yield decoded lines from a binary or text stream without reading it all."""
+    for line in stream:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        yield line.rstrip('\r\n')
+
+def parse_ndjson(stream):
+    """Yield (record number, dict) or (record number, error) for each NDJSON line."""
+    number = 0
+    for line in _lines(stream):
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, ValueError(f"Invalid JSON: {str(e)}")
+            continue
+        if not isinstance(record, dict):
+            yield number, ValueError("Each line must be a JSON object")
+            continue
+        yield number, record
+
+def _unfold(stream):
+    """Join iCalendar continuation lines (those starting with a space or tab)."""
+    current = None
+    for line in _lines(stream):
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current:
+        yield current
+
+_ICS_ESCAPES = {'n': '\n', 'N': '\n', ',': ',', ';': ';', '\\': '\\'}
+_ICS_ESCAPE = re.compile(r'\\([nN,;\\])')
+
+def _ics_unescape(value):
+    # One pass, so the "\\" of an escaped backslash can't pair with a following "n"
+    return _ICS_ESCAPE.sub(lambda match: _ICS_ESCAPES[match.group(1)], value)
+
+def _ics_escape(value):
+    return (value.replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+def _parse_ics_datetime(value, tzid=None):
+    """Parse DATE or DATE-TIME values.
+
+    UTC times and times with a TZID become naive wall-clock times in
+    CALENDAR_TZ; floating times are kept as they are. Raises ValueError for an
+    unknown TZID.
+    """
+    if len(value) == 8:
+        return datetime.strptime(value, '%Y%m%d'), False
+    moment = datetime.strptime(value.rstrip('Z'), '%Y%m%dT%H%M%S')
+    if value.endswith('Z'):
+        zone = timezone.utc
+    elif tzid:
+        try:
+            zone = ZoneInfo(tzid)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown TZID {tzid}")
+    else:
+        return moment, True
+    return moment.replace(tzinfo=zone).astimezone(_LOCAL_ZONE).replace(tzinfo=None), True
+
+def parse_ics(stream):
+    """Yield (record number, dict) or (record number, error) for each VEVENT."""
+    number = 0
+    event = None
+    for line in _unfold(stream):
+        if line == 'BEGIN:VEVENT':
+            number += 1
+            event = {}
+            continue
+        if line == 'END:VEVENT':
+            if event is not None:
+                try:
+                    yield number, _ics_record(event)
+                except KeyError as e:
+                    yield number, ValueError(f"VEVENT is missing {e.args[0]}")
+                except ValueError as e:
+                    yield number, ValueError(f"Invalid VEVENT: {str(e)}")
+            event = None
+            continue
+        if event is None or ':' not in line:
+            continue
+        name, value = line.split(':', 1)
+        name, *parameters = name.split(';')
+        name = name.upper()
+        event[name] = value
+        # Of the parameters only TZID matters; VALUE=DATE is evident from the value
+        for parameter in parameters:
+            key, _, parameter_value = parameter.partition('=')
+            if key.upper() == 'TZID':
+                event[f'{name};TZID'] = parameter_value.strip('"')
+
+def _ics_record(event):
+    """Turn the properties of one VEVENT into an import record."""
+    start, has_time = _parse_ics_datetime(event['DTSTART'], event.get('DTSTART;TZID'))
+    record = {
+        'uid': event.get('UID'),
+        'title': _ics_unescape(event.get('SUMMARY', '')),
+        'description': _ics_unescape(event.get('DESCRIPTION', '')),
+        'date': start.date().isoformat(),
+        'time': start.strftime('%H:%M') if has_time else None,
+        'category': _ics_unescape(event['CATEGORIES'].split(',')[0]) if event.get('CATEGORIES') else None,
+        'priority': _ics_priority_name(event['PRIORITY']) if event.get('PRIORITY') else None
+    }
+    if event.get('DTEND'):
+        end, _ = _parse_ics_datetime(event['DTEND'], event.get('DTEND;TZID'))
+        if end < start:
+            raise ValueError("DTEND is before DTSTART")
+        # An event that ends when it starts gets the default duration
+        record['duration'] = int((end - start).total_seconds() // 60)
+    if event.get('RRULE'):
+        record['rrule'] = event['RRULE']
+    if event.get('EXDATE'):
+        record['exdates'] = [_parse_ics_datetime(day)[0].date().isoformat() for day in event['EXDATE'].split(',')]
+    return record
+
+def import_events(user_id, records, insert_chunk, chunk_size=IMPORT_CHUNK_SIZE):
+    """Validate parsed records and store them in chunks.
+
+    `records` yields (record number, dict or exception). `insert_chunk` takes a
+    list of documents and returns {position in chunk: error message} for the
+    ones it could not insert. UIDs repeated within the upload are skipped.
+    """
+    summary = {'imported': 0, 'failed': 0, 'duplicates': 0, 'errors': []}
+    seen_uids = set()
+    chunk = []
+    numbers = []
+
+    def report(number, message):
+        summary['failed'] += 1
+        if len(summary['errors']) < MAX_REPORTED_ERRORS:
+            summary['errors'].append({'record': number, 'error': message})
+
+    def flush():
+        failures = insert_chunk(chunk)
+        for position, message in failures.items():
+            if message == 'duplicate':
+                summary['duplicates'] += 1
+            else:
+                report(numbers[position], message)
+        summary['imported'] += len(chunk) - len(failures)
+        chunk.clear()
+        numbers.clear()
+
+    for number, record in records:
+        if isinstance(record, Exception):
+            report(number, str(record))
+            continue
+        try:
+            document = build_event_document(user_id, record)
+        except (TypeError, ValueError) as e:
+            report(number, str(e))
+            continue
+
+        uid = document.get('uid')
+        if uid:
+            if uid in seen_uids:
+                summary['duplicates'] += 1
+                continue
+            seen_uids.add(uid)
+
+        chunk.append(document)
+        numbers.append(number)
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return summary
+
+def export_record(event):
+    """Plain JSON-ready version of a stored event."""
+    record = {k: v for k, v in event.items() if k not in ('_id', 'user_id', 'recurrence', 'title_terms')}
+    record['event_id'] = str(event['_id'])
+    if event.get('recurrence'):
+        record['rrule'] = format_rrule(event['recurrence'])
+    if event.get('exdates'):
+        record['exdates'] = [day.date().isoformat() for day in event['exdates']]
+    for key, value in record.items():
+        if isinstance(value, datetime):
+            record[key] = value.isoformat()
+        elif isinstance(value, ObjectId):
+            record[key] = str(value)
+    return record
+
+def export_ndjson(events):
+    """Yield one JSON line per event."""
+    for event in events:
+        yield json.dumps(export_record(event), default=str) + '\n'
+
+def _fold(line):
+    """Fold a content line at 75 octets as RFC 5545 requires."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        # Don't split a multi-byte character
+        while cut and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode('utf-8'))
+    return '\r\n '.join(parts) + '\r\n'
+
+def export_ics(events, default_duration=60):
+    """Yield an iCalendar document one VEVENT at a time."""
+    yield 'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Dynamic Scheduling System//EN\r\n'
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+    for event in events:
+        start = event['date']
+        if isinstance(start, str):
+            start = datetime.fromisoformat(start)
+        lines = [
+            'BEGIN:VEVENT',
+            f"UID:{event.get('uid') or str(event['_id']) + '@dynamic-scheduling'}",
+            f"DTSTAMP:{stamp}"
+        ]
+        if event.get('time'):
+            hour, minute = (int(part) for part in event['time'].split(':')[:2])
+            start = start.replace(hour=hour, minute=minute)
+            end = start + timedelta(minutes=int(event.get('duration') or default_duration))
+            lines.append(f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}")
+            lines.append(f"DTEND:{end.strftime('%Y%m%dT%H%M%S')}")
+        else:
+            lines.append(f"DTSTART;VALUE=DATE:{start.strftime('%Y%m%d')}")
+        lines.append(f"SUMMARY:{_ics_escape(event.get('title') or '')}")
+        if event.get('description'):
+            lines.append(f"DESCRIPTION:{_ics_escape(event['description'])}")
+        if event.get('category'):
+            lines.append(f"CATEGORIES:{_ics_escape(event['category'])}")
+        if event.get('priority') in ICS_PRIORITIES:
+            lines.append(f"PRIORITY:{ICS_PRIORITIES[event['priority']]}")
+        if event.get('recurrence'):
+            lines.append(f"RRULE:{format_rrule(event['recurrence'])}")
+        if event.get('exdates'):
+            lines.append(f"EXDATE;VALUE=DATE:{','.join(day.strftime('%Y%m%d') for day in event['exdates'])}")
+        lines.append('END:VEVENT')
+        yield ''.join(_fold(line) for line in lines)
+    yield 'END:VCALENDAR\r\n'
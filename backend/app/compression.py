@@ -0,0 +1,157 @@
+import gzip
+import os
+import zlib
+from flask import current_app, request
+
+# zstd and brotli are optional; gzip is always offered
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this aren't worth the CPU or the extra header
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', '6'))
+ZSTD_LEVEL = int(os.getenv('ZSTD_LEVEL', '3'))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', '4'))
+
+# Text formats we produce; images and other binary uploads are already compressed
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/x-ndjson',
+    'text/calendar',
+    'text/plain',
+    'text/html',
+    'text/csv'
+}
+
+class _GzipStream:
+    def __init__(self):
+        # wbits 31 writes a gzip header and trailer
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+class _ZstdStream:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+class _BrotliStream:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+def _encoders():
+    # In order of preference when the client rates several equally
+    encoders = {}
+    if zstandard is not None:
+        encoders['zstd'] = (lambda data: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data), _ZstdStream)
+    if brotli is not None:
+        encoders['br'] = (lambda data: brotli.compress(data, quality=BROTLI_QUALITY), _BrotliStream)
+    encoders['gzip'] = (lambda data: gzip.compress(data, GZIP_LEVEL), _GzipStream)
+    return encoders
+
+ENCODERS = _encoders()
+
+def compress(enabled=True, min_size=None):
+    """Per-route compression settings, e.g. @compress(False) or @compress(min_size=256)."""
+    def decorator(f):
+        f.compression = {'enabled': enabled, 'min_size': min_size}
+        return f
+    return decorator
+
+def _route_settings():
+    view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+    return getattr(view, 'compression', None) or {'enabled': True, 'min_size': None}
+
+def _stream(chunks, compressor):
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def compress_response(response):
+    """after_request hook: compress the body with the best encoding the client accepts."""
+    settings = _route_settings()
+    if not settings['enabled'] or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+
+    # The body depends on Accept-Encoding from here on, compressed or not
+    response.vary.add('Accept-Encoding')
+
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers or response.direct_passthrough):
+        return response
+
+    encoding = request.accept_encodings.best_match(list(ENCODERS))
+    if not encoding:
+        return response
+    compress_body, stream_class = ENCODERS[encoding]
+
+    if response.is_streamed:
+        # Length is unknown up front; compress chunk by chunk as they are produced
+        response.response = _stream(response.iter_encoded(), stream_class())
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < _min_size(settings):
+            return response
+        response.set_data(compress_body(body))
+
+    _mark_encoded(response, encoding)
+    return response
+
+def compress_cached(response, encoded):
+    """Compress a response whose body is cached, reusing earlier work.
+
+    `encoded` maps encoding -> compressed body and is kept next to the cached
+    body, so each encoding is computed once per cache entry instead of on every
+    hit. compress_response then leaves the response alone.
+    """
+    settings = _route_settings()
+    if not settings['enabled'] or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    encoding = request.accept_encodings.best_match(list(ENCODERS))
+    body = response.get_data()
+    if not encoding or len(body) < _min_size(settings):
+        return response
+    data = encoded.get(encoding)
+    if data is None:
+        data = encoded[encoding] = ENCODERS[encoding][0](body)
+    response.set_data(data)
+    _mark_encoded(response, encoding)
+    return response
+
+def _min_size(settings):
+    return settings['min_size'] if settings['min_size'] is not None else COMPRESSION_MIN_SIZE
+
+def _mark_encoded(response, encoding):
+    response.headers['Content-Encoding'] = encoding
+    # A strong ETag names exact bytes; the compressed body only matches weakly
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+def init_compression(app):
+    app.after_request(compress_response)
@@ -0,0 +1,274 @@
+import heapq
+import os
+import random
+import threading
+from datetime import datetime, timedelta
+from .cache import LRUCache
+from .database import get_event_intervals_by_user
+from .recurrence import expand_series, horizon_end, RECURRENCE_HORIZON_DAYS
+
+# Events without an explicit end or duration are assumed to last an hour
+DEFAULT_DURATION_MINUTES = 60
+
+# Events are stored by calendar day, so anything starting up to a day before a
+# window may still run into it
+MAX_EVENT_SPAN = timedelta(days=1)
+
+# Per-user indexes are rebuilt after this long so writes made by other worker
+# processes are eventually picked up
+INDEX_TTL_SECONDS = 300
+
+# Most per-user indexes one process keeps; the least recently used go first
+INDEX_CACHE_SIZE = int(os.getenv('CONFLICT_INDEX_CACHE_SIZE', '512'))
+
+def event_interval(event):
+    """Return the half-open [start, end) interval covered by an event."""
+    start = event['date']
+    if isinstance(start, str):
+        start = datetime.fromisoformat(start)
+
+    # The calendar stores the day in `date` and the time of day separately
+    if event.get('time'):
+        hour, minute = (int(part) for part in event['time'].split(':')[:2])
+        start = start.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+    end = event.get('end')
+    if isinstance(end, str):
+        end = datetime.fromisoformat(end)
+    if not end:
+        end = start + timedelta(minutes=int(event.get('duration') or DEFAULT_DURATION_MINUTES))
+    return start, end
+
+def series_index_window():
+    """Days a series is expanded over in the conflict index: a horizon back and ahead of today."""
+    end = horizon_end()
+    return end - timedelta(days=2 * RECURRENCE_HORIZON_DAYS), end
+
+def event_intervals(event):
+    """(id, start, end) for an event, or for each occurrence of a series in the index window."""
+    if not event.get('recurrence'):
+        start, end = event_interval(event)
+        return [(event['_id'], start, end)]
+    window_start, window_end = series_index_window()
+    return [(occurrence['event_id'],) + event_interval(occurrence)
+            for occurrence in expand_series(event, window_start, window_end)]
+
+class _Node:
+    __slots__ = ('key', 'end', 'event_id', 'weight', 'left', 'right', 'max_end')
+
+    def __init__(self, start, end, event_id):
+        self.key = (start, str(event_id))
+        self.end = end
+        self.event_id = event_id
+        self.weight = random.random()
+        self.left = None
+        self.right = None
+        self.max_end = end
+
+def _update(node):
+    node.max_end = node.end
+    if node.left and node.left.max_end > node.max_end:
+        node.max_end = node.left.max_end
+    if node.right and node.right.max_end > node.max_end:
+        node.max_end = node.right.max_end
+
+def _split(node, key):
+    """Split a treap into (< key, >= key)."""
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _split(node.right, key)
+        _update(node)
+        return node, right
+    left, node.left = _split(node.left, key)
+    _update(node)
+    return left, node
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.weight > right.weight:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+def _remove(node, key):
+    if node is None:
+        return None
+    if key == node.key:
+        return _merge(node.left, node.right)
+    if key < node.key:
+        node.left = _remove(node.left, key)
+    else:
+        node.right = _remove(node.right, key)
+    _update(node)
+    return node
+
+class IntervalTree:
+    """Interval tree (a treap keyed on start, augmented with the max end of each subtree).
+
+    Inserts and deletes are O(log n); overlap queries are output-sensitive and
+    only descend into subtrees that can contain an overlapping interval.
+    """
+
+    def __init__(self):
+        self._root = None
+        self._intervals = {}
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def __contains__(self, event_id):
+        return event_id in self._intervals
+
+    def add(self, event_id, start, end):
+        """Insert or replace the interval for an event."""
+        self.remove(event_id)
+        node = _Node(start, end, event_id)
+        left, right = _split(self._root, node.key)
+        self._root = _merge(_merge(left, node), right)
+        self._intervals[event_id] = (start, end)
+
+    def remove(self, event_id):
+        """Remove an event's interval. Returns False if it was not indexed."""
+        interval = self._intervals.pop(event_id, None)
+        if interval is None:
+            return False
+        self._root = _remove(self._root, (interval[0], str(event_id)))
+        return True
+
+    def overlapping(self, start, end):
+        """Return (event_id, start, end) for every interval overlapping [start, end), by start."""
+        found = []
+        stack = []
+        node = self._root
+        # In-order walk that prunes subtrees ending before `start` and stops
+        # once intervals begin at or after `end`
+        while stack or node:
+            while node and node.max_end > start:
+                stack.append(node)
+                node = node.left
+            if not stack:
+                break
+            node = stack.pop()
+            if node.key[0] >= end:
+                break
+            if node.end > start:
+                found.append((node.event_id, node.key[0], node.end))
+            node = node.right
+        return found
+
+class UserIndex(IntervalTree):
+    """One user's events in an interval tree, with each series indexed as its occurrences."""
+
+    def __init__(self):
+        super().__init__()
+        self._occurrences = {}  # series _id -> occurrence ids in the tree
+
+    def add_event(self, event):
+        """Insert or replace an event, or every occurrence of a series. Raises on a malformed date or time."""
+        intervals = event_intervals(event)
+        self.remove_event(event['_id'])
+        for event_id, start, end in intervals:
+            self.add(event_id, start, end)
+        if event.get('recurrence'):
+            self._occurrences[event['_id']] = [event_id for event_id, _, _ in intervals]
+
+    def remove_event(self, event_id):
+        for occurrence_id in self._occurrences.pop(event_id, ()):
+            self.remove(occurrence_id)
+        return self.remove(event_id)
+
+# user_id -> UserIndex; entries expire after INDEX_TTL_SECONDS. The lock
+# guards the trees themselves, which are changed in place.
+_user_indexes = LRUCache(INDEX_CACHE_SIZE, INDEX_TTL_SECONDS)
+_lock = threading.Lock()
+
+def _load_index(user_id):
+    tree = UserIndex()
+    for event in get_event_intervals_by_user(user_id):
+        try:
+            tree.add_event(event)
+        except (KeyError, TypeError, ValueError):
+            # Skip documents with a malformed date or time
+            continue
+    return tree
+
+def get_user_index(user_id):
+    """Get the interval index for a user, building it from the database if needed."""
+    tree = _user_indexes.get(user_id)
+    if tree is None:
+        tree = _load_index(user_id)
+        _user_indexes.set(user_id, tree)
+    return tree
+
+def record_event(event):
+    """Add or refresh an event (every occurrence, for a series) in its owner's index."""
+    tree = get_user_index(event['user_id'])
+    with _lock:
+        tree.add_event(event)
+
+def forget_event(user_id, event_id):
+    """Drop an event, or a series and its occurrences, from its owner's index."""
+    tree = _user_indexes.get(user_id)
+    if tree is not None:
+        with _lock:
+            tree.remove_event(event_id)
+
+def invalidate_user(user_id):
+    """Drop a user's index so it is rebuilt on next use (e.g. after a bulk import)."""
+    _user_indexes.pop(user_id)
+
+def find_event_conflicts(event):
+    """Return the owner's events that overlap an event, or any occurrence of a series."""
+    intervals = event_intervals(event)
+    own = {event_id for event_id, _, _ in intervals}
+    tree = get_user_index(event['user_id'])
+    conflicts = {}
+    with _lock:
+        for _, start, end in intervals:
+            for event_id, hit_start, hit_end in tree.overlapping(start, end):
+                if event_id not in own:
+                    conflicts[(str(event_id), hit_start)] = {
+                        'event_id': str(event_id), 'start': hit_start.isoformat(), 'end': hit_end.isoformat()
+                    }
+    return sorted(conflicts.values(), key=lambda conflict: conflict['start'])
+
+def find_conflicting_pairs(events, window_start=None, window_end=None):
+    """Report every pair of overlapping events with a sweep-line pass.
+
+    Occurrences of a series are told apart by their `event_id`. Runs in
+    O(n log n + k) for n events and k overlapping pairs.
+    """
+    intervals = []
+    for event in events:
+        try:
+            start, end = event_interval(event)
+        except (KeyError, TypeError, ValueError):
+            continue
+        if window_start and end <= window_start:
+            continue
+        if window_end and start >= window_end:
+            continue
+        intervals.append((start, end, str(event.get('event_id', event.get('_id')))))
+    intervals.sort()
+
+    pairs = []
+    active = []  # min-heap of (end, start, event_id) still open at the sweep line
+    for start, end, event_id in intervals:
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        for other_end, other_start, other_id in active:
+            pairs.append({
+                'first': other_id,
+                'second': event_id,
+                'overlap_start': start.isoformat(),
+                'overlap_end': min(end, other_end).isoformat()
+            })
+        heapq.heappush(active, (end, start, event_id))
+    return pairs
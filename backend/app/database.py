@@ -1,8 +1,15 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+from pymongo.write_concern import WriteConcern
 from bson import ObjectId
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from contextlib import contextmanager
 from datetime import datetime
 import os
+import threading
 from dotenv import load_dotenv
+from .metrics import mongo_listeners
 
 # Load environment variables
 load_dotenv()
@@ -11,26 +18,126 @@ load_dotenv()
 MONGO_URI = os.getenv('MONGO_URI')
 DB_NAME = os.getenv('DB_NAME', 'dynamic_scheduling')
 
-if not MONGO_URI:
-    raise ValueError("MongoDB connection string not found. Please set MONGO_URI in .env file")
+# Connection pool and timeout settings, per worker process
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '50'))
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', '30000'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+# Wire compression, in order of preference; the server picks the first it supports
+MONGO_COMPRESSORS = os.getenv('MONGO_COMPRESSORS', 'zstd,snappy,zlib')
 
-# Create MongoDB client
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
+def client_options():
+    """Keyword arguments for the MongoDB client."""
+    options = {
+        'maxPoolSize': MONGO_MAX_POOL_SIZE,
+        'minPoolSize': MONGO_MIN_POOL_SIZE,
+        'connectTimeoutMS': MONGO_CONNECT_TIMEOUT_MS,
+        'serverSelectionTimeoutMS': MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        'socketTimeoutMS': MONGO_SOCKET_TIMEOUT_MS,
+        'waitQueueTimeoutMS': MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        # Command and pool-checkout timings for /metrics
+        'event_listeners': mongo_listeners()
+    }
+    compressors = [name for name in MONGO_COMPRESSORS.split(',') if name and _compressor_available(name)]
+    if compressors:
+        options['compressors'] = compressors
+    return options
+
+def _compressor_available(name):
+    # zstd and snappy need optional packages; zlib is always there
+    modules = {'zstd': 'zstandard', 'snappy': 'snappy', 'zlib': 'zlib'}
+    try:
+        __import__(modules[name])
+        return True
+    except (KeyError, ImportError):
+        return False
+
+# One client per process. MongoClient is not fork-safe, so a process that finds
+# a client created by its parent (e.g. a pre-forked worker) builds its own.
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Return this process's MongoClient, connecting on first use."""
+    global _client, _client_pid
+    if _client is not None and _client_pid == os.getpid():
+        return _client
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            if not MONGO_URI:
+                raise ValueError("MongoDB connection string not found. Please set MONGO_URI in .env file")
+            _client = MongoClient(MONGO_URI, connect=False, **client_options())
+            _client_pid = os.getpid()
+        return _client
+
+def close_client():
+    """Close this process's client, e.g. in a server's master before it forks workers."""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+def get_db():
+    """Return the application database on this process's client."""
+    return get_client()[DB_NAME]
+
+class _LazyCollection:
+    """Stands in for a collection and resolves it on this process's client when used."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attribute):
+        return getattr(get_db()[self.name], attribute)
+
+class _LazyDatabase:
+    """Stands in for the database and resolves it on this process's client when used."""
+
+    def __getattr__(self, attribute):
+        return getattr(get_db(), attribute)
+
+    def __getitem__(self, name):
+        return get_db()[name]
+
+db = _LazyDatabase()
 
 # Collections
-users_collection = db.users
-events_collection = db.events
+users_collection = _LazyCollection('users')
+events_collection = _LazyCollection('events')
+tasks_collection = _LazyCollection('tasks')
+counters_collection = _LazyCollection('counters')
+tombstones_collection = _LazyCollection('event_tombstones')
+revoked_tokens_collection = _LazyCollection('revoked_tokens')
+
+# Deleted events are remembered this long for the change feed
+TOMBSTONE_RETENTION_DAYS = int(os.getenv('TOMBSTONE_RETENTION_DAYS', '30'))
+
+# A change sequence number still reserved after this long is treated as
+# abandoned (its writer died or timed out) and no longer holds back the feed
+EVENT_SEQ_SETTLE_MS = int(os.getenv('EVENT_SEQ_SETTLE_MS', str(2 * MONGO_SOCKET_TIMEOUT_MS)))
+# Most reservations remembered per user
+EVENT_SEQ_MAX_OPEN = 1000
+
+# Usernames compare case-insensitively ("Alice" and "alice" are the same user)
+USERNAME_COLLATION = {'locale': 'en', 'strength': 2}
 
 def init_db():
-    """Initialize the database with required indexes and collections."""
+    """Make sure the database has the indexes in app.indexes.INDEX_SPEC.
+
+    This is one lookup when they are already up to date; otherwise the missing
+    ones are built in the background.
+    """
+    from .indexes import ensure_indexes
     try:
-        # Create indexes
-        users_collection.create_index('email', unique=True)
-        users_collection.create_index('username', unique=True)
-        events_collection.create_index([('user_id', 1), ('date', 1)])
-        events_collection.create_index('date')
-        print("Database initialized successfully")
+        if ensure_indexes() is None:
+            print("Database indexes are up to date")
+        else:
+            print("Building missing database indexes in the background")
     except Exception as e:
         print(f"Error initializing database: {str(e)}")
 
@@ -51,25 +158,383 @@ def get_user_by_email(email):
     """Get a user by email."""
     return users_collection.find_one({'email': email})
 
+def get_user_by_username(username):
+    """Get a user by username, ignoring case."""
+    return users_collection.find_one({'username': username}, collation=USERNAME_COLLATION)
+
 def get_user_by_id(user_id):
     """Get a user by ID."""
     if isinstance(user_id, str):
         user_id = ObjectId(user_id)
     return users_collection.find_one({'_id': user_id})
 
+def get_users_by_emails(emails):
+    """Get the IDs and emails of the users registered under any of the given emails."""
+    return list(users_collection.find({'email': {'$in': list(emails)}}, {'email': 1}))
+
+# Token revocation
+def add_revoked_token(digest, expires_at):
+    """Add a token digest to the shared denylist, stamped with the server's clock."""
+    revoked_tokens_collection.update_one(
+        {'_id': digest},
+        {'$set': {'expires_at': expires_at}, '$currentDate': {'revoked_at': True}},
+        upsert=True
+    )
+
+def get_revoked_tokens_since(since):
+    """Get denylist entries added at or after a moment."""
+    return list(revoked_tokens_collection.find({'revoked_at': {'$gte': since}}))
+
 # Event operations
+RAW_CODEC_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+
 def create_event(event_data):
     """Create a new event in the database."""
     result = events_collection.insert_one(event_data)
     event_data['_id'] = result.inserted_id
     return event_data
 
-def get_events_by_user(user_id, start_date=None, end_date=None):
-    """Get events for a user within a date range."""
+def get_events_by_user(user_id, start_date=None, end_date=None, limit=None, after=None, projection=None, raw=False,
+                       exclude_series=False):
+    """Get events for a user within a date range, ordered by (date, _id).
+
+    `after` is a (date, _id) pair from a previous page; only events sorting
+    strictly after it are returned, so paging stays on the (user_id, date) index.
+    `projection` limits the fields fetched; with `raw` the documents come back
+    as undecoded RawBSONDocuments. `exclude_series` leaves out recurring series,
+    which callers expand themselves.
+    """
     query = {'user_id': user_id}
-    if start_date and end_date:
-        query['date'] = {'$gte': start_date, '$lte': end_date}
-    return list(events_collection.find(query).sort('date', 1))
+    if exclude_series:
+        query['recurrence'] = {'$exists': False}
+    date_range = {}
+    if start_date:
+        date_range['$gte'] = start_date
+    if end_date:
+        date_range['$lte'] = end_date
+    if date_range:
+        query['date'] = date_range
+    if after:
+        last_date, last_id = after
+        query['$or'] = [
+            {'date': {'$gt': last_date}},
+            {'date': last_date, '_id': {'$gt': last_id}}
+        ]
+    collection = events_collection.with_options(codec_options=RAW_CODEC_OPTIONS) if raw else events_collection
+    cursor = collection.find(query, projection).sort([('date', 1), ('_id', 1)])
+    if limit:
+        cursor = cursor.limit(limit)
+    return list(cursor)
+
+def summarize_events_by_user(user_id, start_date, end_date, unit='day', top=3):
+    """Count a user's events per day or week in [start_date, end_date).
+
+    Returns one document per bucket, oldest first: {_id: bucket start, total,
+    breakdown: [{category, priority, count}], top: [{title, priority, time}]}
+    where `top` holds the earliest `top` events of the bucket. Recurring series
+    are not included. Needs MongoDB 5.2+ ($dateTrunc, $topN, $sortArray).
+    """
+    bucket = {'$dateTrunc': {'date': '$date', 'unit': unit}}
+    if unit == 'week':
+        bucket['$dateTrunc']['startOfWeek'] = 'monday'
+    pipeline = [
+        # Served by the (user_id, date, ...) index
+        {'$match': {
+            'user_id': user_id,
+            'date': {'$gte': start_date, '$lt': end_date},
+            'recurrence': {'$exists': False}
+        }},
+        {'$group': {
+            '_id': {'bucket': bucket, 'category': '$category', 'priority': '$priority'},
+            'count': {'$sum': 1},
+            'top': {'$topN': {
+                'n': top,
+                'sortBy': {'date': 1, 'time': 1},
+                'output': {'title': '$title', 'priority': '$priority', 'time': '$time', 'date': '$date'}
+            }}
+        }},
+        {'$group': {
+            '_id': '$_id.bucket',
+            'total': {'$sum': '$count'},
+            'breakdown': {'$push': {'category': '$_id.category', 'priority': '$_id.priority', 'count': '$count'}},
+            'top': {'$push': '$top'}
+        }},
+        {'$project': {
+            'total': 1,
+            'breakdown': 1,
+            'top': {'$slice': [
+                {'$sortArray': {
+                    'input': {'$reduce': {'input': '$top', 'initialValue': [], 'in': {'$concatArrays': ['$$value', '$$this']}}},
+                    'sortBy': {'date': 1, 'time': 1}
+                }},
+                top
+            ]}
+        }},
+        {'$sort': {'_id': 1}}
+    ]
+    return list(events_collection.aggregate(pipeline))
+
+def search_events_by_user(user_id, text, limit, after=None, projection=None, max_time_ms=None):
+    """Full-text search of a user's event titles and descriptions, best matches first.
+
+    Uses the (user_id, text) index, so only this user's index entries are read.
+    Results are ordered by (score desc, _id) and carry their `score`; `after`
+    is the (score, _id) of the last result of the previous page.
+    """
+    pipeline = [
+        {'$match': {'user_id': user_id, '$text': {'$search': text}}},
+        {'$addFields': {'score': {'$meta': 'textScore'}}}
+    ]
+    if after:
+        last_score, last_id = after
+        pipeline.append({'$match': {'$or': [
+            {'score': {'$lt': last_score}},
+            {'score': last_score, '_id': {'$gt': last_id}}
+        ]}})
+    pipeline += [{'$sort': {'score': -1, '_id': 1}}, {'$limit': limit}]
+    if projection:
+        pipeline.append({'$project': dict(projection, score=1)})
+    return list(events_collection.aggregate(pipeline, maxTimeMS=max_time_ms))
+
+def suggest_events_by_user(user_id, prefixes, limit, projection=None, max_time_ms=None):
+    """A user's latest events whose title words start with every one of `prefixes`."""
+    cursor = events_collection.find({'user_id': user_id, 'title_terms': {'$all': prefixes}}, projection)
+    cursor = cursor.sort([('date', -1), ('_id', -1)]).limit(limit)
+    if max_time_ms:
+        cursor = cursor.max_time_ms(max_time_ms)
+    return list(cursor)
+
+def iter_events_missing_terms(batch_size=500):
+    """Events without autocomplete terms, i.e. stored before they were introduced."""
+    return events_collection.find({'title_terms': {'$exists': False}}, {'title': 1}).batch_size(batch_size)
+
+def set_title_terms(updates):
+    """Write (event _id, title terms) pairs in one bulk write. Returns the number modified."""
+    result = events_collection.bulk_write(
+        [UpdateOne({'_id': event_id}, {'$set': {'title_terms': terms}}) for event_id, terms in updates],
+        ordered=False
+    )
+    return result.modified_count
+
+def get_series_by_user(user_id, start_date=None, end_date=None):
+    """Get a user's recurring series that may have occurrences in a date range."""
+    query = {'user_id': user_id, 'recurrence': {'$exists': True}}
+    if end_date:
+        query['date'] = {'$lte': end_date}
+    if start_date:
+        # Series with a COUNT are kept; only expansion knows where they end
+        query['$or'] = [
+            {'recurrence.until': {'$exists': False}},
+            {'recurrence.until': {'$gte': start_date}}
+        ]
+    return list(events_collection.find(query))
+
+def add_event_exdate(event_id, user_id, day):
+    """Skip one occurrence of a user's series. Returns the updated series or None."""
+    day_key = day.strftime('%Y-%m-%d')
+    with reserved_event_seqs(user_id) as seq:
+        return events_collection.find_one_and_update(
+            {'_id': event_id, 'user_id': user_id, 'recurrence': {'$exists': True}},
+            {
+                '$addToSet': {'exdates': day},
+                '$unset': {f'overrides.{day_key}': ''},
+                '$set': {'updated_seq': seq}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+
+def iter_events_by_user(user_id, start_date=None, end_date=None, batch_size=500):
+    """Return a cursor over a user's events in date order, fetched in batches."""
+    query = {'user_id': user_id}
+    date_range = {}
+    if start_date:
+        date_range['$gte'] = start_date
+    if end_date:
+        date_range['$lte'] = end_date
+    if date_range:
+        query['date'] = date_range
+    return events_collection.find(query).sort([('date', 1), ('_id', 1)]).batch_size(batch_size)
+
+def insert_events(documents):
+    """Insert events in one unordered batch.
+
+    Returns {position: error} for the documents that failed; duplicate UIDs are
+    reported as 'duplicate'.
+    """
+    if not documents:
+        return {}
+    try:
+        with reserved_event_seqs(documents[0]['user_id'], len(documents)) as last:
+            stamp_event_seqs(documents, last)
+            events_collection.insert_many(documents, ordered=False)
+        return {}
+    except BulkWriteError as e:
+        failures = {}
+        for error in e.details.get('writeErrors', []):
+            failures[error['index']] = 'duplicate' if error['code'] == 11000 else error.get('errmsg', 'Write failed')
+        return failures
+
+# Change tracking
+#
+# Every event write takes the next number from a per-user counter and stores it
+# as `updated_seq`. Numbers are handed out before the write lands, so writes can
+# commit out of order: the counter also keeps a log of reservations whose write
+# has not finished, and the change feed only goes up to the settled watermark,
+# the number just below the oldest of them. A reservation whose writer never
+# reports back stops holding the feed after EVENT_SEQ_SETTLE_MS.
+#
+# The same document carries `version`, bumped by every reservation and every
+# release, which keys the response caches of all workers.
+def _counter_id(user_id):
+    return f'events:{user_id}'
+
+def _live_reservations():
+    # Judged by server time, so every process agrees on which ones have lapsed
+    since = {'$subtract': ['$$NOW', EVENT_SEQ_SETTLE_MS]}
+    return {'$filter': {'input': {'$ifNull': ['$open', []]}, 'cond': {'$gt': ['$$this.at', since]}}}
+
+def next_event_seq(user_id, count=1):
+    """Reserve `count` change sequence numbers for a user; returns the last one.
+
+    The caller must release it with release_event_seq once its write is done;
+    reserved_event_seqs does both.
+    """
+    counter = counters_collection.find_one_and_update(
+        {'_id': _counter_id(user_id)},
+        [
+            {'$set': {
+                'seq': {'$add': [{'$ifNull': ['$seq', 0]}, count]},
+                'version': {'$add': [{'$ifNull': ['$version', 0]}, 1]}
+            }},
+            {'$set': {'open': {'$slice': [
+                {'$concatArrays': [_live_reservations(), [{'first': {'$subtract': ['$seq', count - 1]}, 'last': '$seq', 'at': '$$NOW'}]]},
+                -EVENT_SEQ_MAX_OPEN
+            ]}}}
+        ],
+        projection={'seq': 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter['seq']
+
+def release_event_seq(user_id, last):
+    """Mark the reservation ending at `last` as written. Fire-and-forget: a lost release just lapses."""
+    counters_collection.with_options(write_concern=WriteConcern(w=0)).update_one(
+        {'_id': _counter_id(user_id)},
+        {'$pull': {'open': {'last': last}}, '$inc': {'version': 1}}
+    )
+
+@contextmanager
+def reserved_event_seqs(user_id, count=1):
+    """Reserve change sequence numbers around a write; yields the last one."""
+    last = next_event_seq(user_id, count)
+    try:
+        yield last
+    except OperationFailure:
+        # The server answered, so the write is not still running
+        release_event_seq(user_id, last)
+        raise
+    else:
+        release_event_seq(user_id, last)
+    # On any other error (a timeout, a lost connection) the write may still
+    # land, so the reservation is left to lapse
+
+def event_version(user_id):
+    """A user's event version as every worker sees it; it changes around each write."""
+    counter = counters_collection.find_one({'_id': _counter_id(user_id)}, {'version': 1})
+    return counter.get('version', 0) if counter else 0
+
+def settled_event_seq(user_id):
+    """The highest change sequence number below which every write has landed."""
+    counters = list(counters_collection.aggregate([
+        {'$match': {'_id': _counter_id(user_id)}},
+        {'$project': {'seq': 1, 'pending': {'$min': {'$map': {'input': _live_reservations(), 'in': '$$this.first'}}}}}
+    ]))
+    if not counters:
+        return 0
+    counter = counters[0]
+    if counter.get('pending') is not None:
+        return counter['pending'] - 1
+    return counter['seq']
+
+def stamp_event_seqs(documents, last):
+    """Give each document its own `updated_seq` from a reservation ending at `last`."""
+    for offset, document in enumerate(documents):
+        document['updated_seq'] = last - len(documents) + offset + 1
+    return documents
+
+def add_tombstones(user_id, event_ids):
+    """Record deleted events so the change feed can report them."""
+    event_ids = list(event_ids)
+    if not event_ids:
+        return
+    now = datetime.utcnow()
+    with reserved_event_seqs(user_id, len(event_ids)) as last:
+        tombstones_collection.insert_many([
+            {
+                'user_id': user_id,
+                'event_id': event_id,
+                'updated_seq': last - len(event_ids) + offset + 1,
+                'deleted_at': now
+            }
+            for offset, event_id in enumerate(event_ids)
+        ])
+
+def get_events_changed_since(user_id, seq, upto, limit):
+    """Get a user's events written after a change sequence number and up to `upto`, oldest first."""
+    query = {'user_id': user_id, 'updated_seq': {'$gt': seq, '$lte': upto}}
+    return list(events_collection.find(query).sort('updated_seq', 1).limit(limit))
+
+def get_tombstones_since(user_id, seq, upto, limit):
+    """Get a user's deletions after a change sequence number and up to `upto`, oldest first."""
+    query = {'user_id': user_id, 'updated_seq': {'$gt': seq, '$lte': upto}}
+    return list(tombstones_collection.find(query).sort('updated_seq', 1).limit(limit))
+
+def get_event_owners(event_ids):
+    """Map each existing event ID to its owner with a single query."""
+    cursor = events_collection.find({'_id': {'$in': list(event_ids)}}, {'user_id': 1})
+    return {event['_id']: event['user_id'] for event in cursor}
+
+def bulk_write_events(requests, ordered=True):
+    """Run a list of write requests in one round trip.
+
+    Returns {request index: error message} for the requests that failed.
+    """
+    try:
+        events_collection.bulk_write(requests, ordered=ordered)
+        return {}
+    except BulkWriteError as e:
+        return {error['index']: error.get('errmsg', 'Write failed') for error in e.details.get('writeErrors', [])}
+
+# What expanding a series needs beyond its own fields
+SERIES_PROJECTION = {'recurrence': 1, 'exdates': 1, 'overrides': 1, 'updated_seq': 1}
+
+def get_event_intervals_by_user(user_id):
+    """Get only the fields needed to place a user's events, and expand their series, on a timeline."""
+    projection = dict(SERIES_PROJECTION, user_id=1, date=1, time=1, duration=1, end=1)
+    return events_collection.find({'user_id': user_id}, projection)
+
+def get_events_for_attendees(user_ids, emails, start_date, end_date):
+    """Get events in a date range owned by any of the users or listing any of the emails as a participant.
+
+    Recurring series that start before the window are included too, for the
+    caller to expand.
+    """
+    query = {
+        '$and': [
+            {'$or': [
+                {'user_id': {'$in': list(user_ids)}},
+                {'participants.email': {'$in': list(emails)}}
+            ]},
+            {'$or': [
+                {'date': {'$gte': start_date, '$lte': end_date}},
+                {'recurrence': {'$exists': True}, 'date': {'$lte': end_date}}
+            ]}
+        ]
+    }
+    projection = {'user_id': 1, 'date': 1, 'time': 1, 'duration': 1, 'end': 1, 'participants.email': 1}
+    projection.update(SERIES_PROJECTION)
+    return events_collection.find(query, projection)
 
 def get_event_by_id(event_id):
     """Get an event by ID."""
@@ -87,9 +552,107 @@ def update_event(event_id, update_data):
     )
     return result.modified_count > 0
 
+def update_event_for_owner(event_id, user_id, update_data):
+    """Update an event only if the user owns it.
+
+    Returns the updated event, or None if no event with that ID belongs to the user.
+    Costs two acknowledged round trips (reserving a change sequence number,
+    then the owner-filtered write) plus the unacknowledged release.
+    """
+    with reserved_event_seqs(user_id) as seq:
+        return events_collection.find_one_and_update(
+            {'_id': event_id, 'user_id': user_id},
+            {'$set': dict(update_data, updated_seq=seq)},
+            return_document=ReturnDocument.AFTER
+        )
+
+def delete_event_for_owner(event_id, user_id):
+    """Delete an event only if the user owns it. Returns the deleted event or None.
+
+    The owner-filtered delete is one round trip; a successful one adds the
+    tombstone write with its sequence reservation (two more, plus the
+    unacknowledged release).
+    """
+    deleted = events_collection.find_one_and_delete({'_id': event_id, 'user_id': user_id})
+    if deleted:
+        add_tombstones(user_id, [event_id])
+    return deleted
+
+def event_exists(event_id):
+    """Check whether an event exists at all."""
+    return events_collection.find_one({'_id': event_id}, {'_id': 1}) is not None
+
 def delete_event(event_id):
     """Delete an event."""
     if isinstance(event_id, str):
         event_id = ObjectId(event_id)
     result = events_collection.delete_one({'_id': event_id})
-    return result.deleted_count > 0 
\ No newline at end of file
+    return result.deleted_count > 0
+
+# Task operations
+# Tasks are addressed by their string `id`; Mongo's _id is never returned
+# `rank` and `rank_weights` back the /api/tasks/next query and are not part of a task
+TASK_PROJECTION = {'_id': 0, 'rank': 0, 'rank_weights': 0}
+
+def create_task(task_data):
+    """Create a new task in the database."""
+    tasks_collection.insert_one(dict(task_data))
+    return task_data
+
+def get_task_by_id(task_id):
+    """Get a task by its ID."""
+    return tasks_collection.find_one({'id': task_id}, TASK_PROJECTION)
+
+def get_tasks_by_ids(task_ids, user_id):
+    """Get every task of a user (None for anonymous tasks) whose ID is in the list."""
+    return list(tasks_collection.find({'id': {'$in': list(task_ids)}, 'user_id': user_id}, TASK_PROJECTION))
+
+def get_tasks(user_id=None, status=None, priority=None):
+    """Get a user's tasks, optionally filtered by status or priority."""
+    query = {'user_id': user_id}
+    if status is not None:
+        query['status'] = status
+    if priority is not None:
+        query['priority'] = priority
+        return list(tasks_collection.find(query, TASK_PROJECTION).sort('due_date', 1))
+    return list(tasks_collection.find(query, TASK_PROJECTION))
+
+def get_ranked_tasks(user_id, limit):
+    """A user's open tasks with the highest stored rank, best first."""
+    # Closed tasks have a null rank, which the $type bound keeps out of the index scan
+    query = {'user_id': user_id, 'rank': {'$type': 'number'}}
+    return list(tasks_collection.find(query, TASK_PROJECTION).sort('rank', -1).limit(limit))
+
+def iter_tasks_to_rank(weights, batch_size=500):
+    """Tasks without a rank, or ranked under weights other than `weights`."""
+    return tasks_collection.find({'rank_weights': {'$ne': weights}}, TASK_PROJECTION).batch_size(batch_size)
+
+def set_task_ranks(updates):
+    """Write (task id, ranking fields) pairs in one bulk write. Returns the number modified."""
+    result = tasks_collection.bulk_write(
+        [UpdateOne({'id': task_id}, {'$set': fields}) for task_id, fields in updates],
+        ordered=False
+    )
+    return result.modified_count
+
+def get_all_tasks():
+    """Get every stored task."""
+    return tasks_collection.find({}, TASK_PROJECTION)
+
+def count_tasks():
+    """Count all stored tasks."""
+    return tasks_collection.estimated_document_count()
+
+def update_task(task_id, update_data):
+    """Update a task and return the new version, or None if it does not exist."""
+    return tasks_collection.find_one_and_update(
+        {'id': task_id},
+        {'$set': update_data},
+        projection=TASK_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+
+def delete_task(task_id):
+    """Delete a task."""
+    result = tasks_collection.delete_one({'id': task_id})
+    return result.deleted_count > 0
@@ -0,0 +1,326 @@
+import calendar
+import re
+from datetime import date, timedelta
+from .cache import LRUCache
+
+# Quick-add parser: turns "lunch with Bob tomorrow 1pm for 45m #personal !high"
+# into the fields POST /api/events takes. It is a fixed grammar, not a model:
+# every recognised phrase is one alternative of a single compiled pattern, the
+# line is scanned once, and whatever isn't recognised becomes the title.
+
+# Most lines one request may parse, and the longest line looked at
+MAX_PARSE_LINES = 10000
+MAX_LINE_LENGTH = 500
+
+WEEKDAY_NAMES = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+WEEKDAY_ABBREVIATIONS = {
+    'mon': 0, 'tue': 1, 'tues': 1, 'wed': 2, 'weds': 2, 'thu': 3, 'thur': 3, 'thurs': 3,
+    'fri': 4, 'sat': 5, 'sun': 6
+}
+WEEKDAYS = dict(WEEKDAY_ABBREVIATIONS, **{name: day for day, name in enumerate(WEEKDAY_NAMES)})
+RRULE_DAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+MONTHS = {}
+for _number, _name in enumerate(calendar.month_name[1:], 1):
+    MONTHS[_name.lower()] = _number
+    MONTHS[_name[:3].lower()] = _number
+MONTHS['sept'] = 9
+
+PRIORITIES = {
+    'high': 'high', 'h': 'high', 'urgent': 'high', '1': 'high', '!!!': 'high',
+    'medium': 'medium', 'med': 'medium', 'm': 'medium', '2': 'medium', '!!': 'medium',
+    'low': 'low', 'l': 'low', '3': 'low', '!': 'low'
+}
+
+NUMBER_WORDS = {'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'other': 2}
+
+def _alternatives(words):
+    # Longest first, so "thursday" wins over "thu"
+    return '|'.join(sorted(words, key=len, reverse=True))
+
+_DAY_FULL = _alternatives(WEEKDAY_NAMES)
+_DAY_ANY = _alternatives(WEEKDAYS)
+_MONTH = _alternatives(MONTHS)
+_ORDINAL = r'(?:st|nd|rd|th)?'
+_CLOCK = r'\d{1,2}(?::\d{2})?\s*(?:[ap]\.?m\.?)?'
+_MINUTES = r'(?:m|mins?|minutes?)'
+_HOURS = r'(?:h|hrs?|hours?)'
+
+# Each kind of phrase the parser understands, tried in this order at every
+# position. Groups inside are named after the kind so they stay unique.
+GRAMMAR = [
+    ('range', rf'(?:from\s+)?(?P<range_start>{_CLOCK})\s*(?:-|–|to|until|till)\s*(?P<range_end>{_CLOCK})'),
+    ('duration', rf'for\s+(?:(?P<duration_hours>\d+(?:\.\d+)?)\s*{_HOURS}(?:\s*(?P<duration_extra>\d+)\s*{_MINUTES})?'
+                 rf'|(?P<duration_minutes>\d+)\s*{_MINUTES}|(?P<duration_half>half\s+an\s+hour)|(?P<duration_one>an?\s+hour))'),
+    ('recurrence', rf'every\s+(?:(?P<recurrence_interval>\d+|other)\s+)?'
+                   rf'(?P<recurrence_unit>weekday|days?|weeks?|months?|years?'
+                   rf'|(?:{_DAY_ANY})(?:\s*(?:,|and|&)\s*(?:{_DAY_ANY}))*)'
+                   rf'|(?P<recurrence_word>daily|weekly|monthly|yearly)'),
+    ('iso', r'(?:on\s+)?(?P<iso_date>\d{4}-\d{2}-\d{2})'),
+    ('numeric', r'(?:on\s+)?(?P<numeric_month>\d{1,2})/(?P<numeric_day>\d{1,2})(?:/(?P<numeric_year>\d{2}|\d{4}))?'),
+    ('month_day', rf'(?:on\s+)?(?P<month_day_month>{_MONTH})\.?\s+(?P<month_day_day>\d{{1,2}}){_ORDINAL}'
+                  rf'(?:,?\s+(?P<month_day_year>\d{{4}}))?'),
+    ('day_month', rf'(?:on\s+)?(?:the\s+)?(?P<day_month_day>\d{{1,2}}){_ORDINAL}\s+(?:of\s+)?(?P<day_month_month>{_MONTH})'
+                  rf'(?:,?\s+(?P<day_month_year>\d{{4}}))?'),
+    ('relative', r'(?P<relative_word>day\s+after\s+tomorrow|today|tonight|tomorrow|tmrw|tmr)'),
+    ('weekday', rf'(?:(?:on|next|this)\s+)+(?P<weekday_day>{_DAY_ANY})\.?|(?P<weekday_full>{_DAY_FULL})'),
+    ('offset', r'in\s+(?P<offset_count>\d+|an?|one|two|three|four)\s+(?P<offset_unit>days?|weeks?|months?)'
+               r'|(?P<offset_next>next\s+(?:week|month))'),
+    ('time', rf'(?:(?:at|@)\s*)?(?P<time_ampm>\d{{1,2}}(?::\d{{2}})?\s*[ap]\.?m\.?)'
+             rf'|(?:at|@)\s*(?P<time_at>\d{{1,2}}(?::\d{{2}})?)'
+             rf'|(?P<time_clock>\d{{1,2}}:\d{{2}})'
+             rf'|(?:at\s+)?(?P<time_word>noon|midnight)'),
+    ('tag', r'#(?P<tag_name>\w+)'),
+    ('priority', r'!(?P<priority_word>high|medium|med|low|urgent|[hml123])|(?P<priority_bangs>!{1,3})')
+]
+
+# One pass over the line: a phrase must start and end on a word boundary
+_PATTERN = re.compile(
+    '|'.join(rf'(?<![\w#!])(?P<{kind}>{pattern})(?![\w!])' for kind, pattern in GRAMMAR),
+    re.IGNORECASE
+)
+
+# Connecting words left dangling at either end of the title once phrases are cut out
+_DANGLING = re.compile(r'^(?:(?:on|at|for|from|by|due)\b[\s,;:-]*)+|(?:[\s,;:-]*\b(?:on|at|for|from|by|due))+$'
+                       r'|^[\s,;:-]+|[\s,;:-]+$', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+# (phrase, today) -> date. Relative phrases repeat a lot within a day and a
+# batch, so each is worked out once per day.
+DATE_CACHE_SIZE = 4096
+_dates = LRUCache(DATE_CACHE_SIZE, 24 * 60 * 60)
+
+def _add_months(day, months):
+    """Same day-of-month `months` later, clamped to the end of shorter months."""
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+def _upcoming(month, day, today):
+    """The next `month`/`day` on or after today. Raises ValueError for impossible dates."""
+    candidate = date(today.year, month, day) if (month, day) != (2, 29) or calendar.isleap(today.year) else None
+    if candidate is None or candidate < today:
+        year = today.year + 1
+        while (month, day) == (2, 29) and not calendar.isleap(year):
+            year += 1
+        candidate = date(year, month, day)
+    return candidate
+
+def _count(value):
+    value = value.lower()
+    return int(value) if value.isdigit() else NUMBER_WORDS[value]
+
+def _resolve_date(kind, groups, today):
+    """The date a date phrase names, relative to `today`. Raises ValueError/KeyError when invalid."""
+    if kind == 'iso':
+        return date.fromisoformat(groups['iso_date'])
+    if kind == 'numeric':
+        month, day = int(groups['numeric_month']), int(groups['numeric_day'])
+        year = groups['numeric_year']
+        if year:
+            return date(int(year) + (2000 if len(year) == 2 else 0), month, day)
+        return _upcoming(month, day, today)
+    if kind in ('month_day', 'day_month'):
+        month = MONTHS[groups[f'{kind}_month'].lower()]
+        day = int(groups[f'{kind}_day'])
+        year = groups[f'{kind}_year']
+        return date(int(year), month, day) if year else _upcoming(month, day, today)
+    if kind == 'relative':
+        word = _SPACES.sub(' ', groups['relative_word'].lower())
+        if word in ('today', 'tonight'):
+            return today
+        if word == 'day after tomorrow':
+            return today + timedelta(days=2)
+        return today + timedelta(days=1)
+    if kind == 'weekday':
+        phrase = (groups['weekday_day'] or groups['weekday_full']).lower()
+        # A bare weekday is the next one on or after today; "next" adds a week
+        days_ahead = (WEEKDAYS[phrase] - today.weekday()) % 7
+        if 'next' in groups['weekday'].lower().split():
+            days_ahead += 7
+        return today + timedelta(days=days_ahead)
+    if kind == 'offset':
+        if groups['offset_next']:
+            if groups['offset_next'].lower().endswith('week'):
+                # Monday of next week
+                return today + timedelta(days=7 - today.weekday())
+            return _add_months(today.replace(day=1), 1)
+        count = _count(groups['offset_count'])
+        unit = groups['offset_unit'].lower()
+        if unit.startswith('day'):
+            return today + timedelta(days=count)
+        if unit.startswith('week'):
+            return today + timedelta(weeks=count)
+        return _add_months(today, count)
+    raise ValueError(f'Not a date phrase: {kind}')
+
+def resolve_date(kind, groups, today):
+    """Cached _resolve_date: the same phrase on the same day always gives the same date."""
+    key = (kind, groups[kind].lower(), today)
+    cached = _dates.get(key)
+    if cached is None:
+        cached = _resolve_date(kind, groups, today)
+        _dates.set(key, cached)
+    return cached
+
+def _clock(text, meridiem=None):
+    """(hour, minute) of a clock phrase such as "1pm", "13:00" or "9". Raises ValueError."""
+    text = text.lower().replace('.', '').replace(' ', '')
+    if text.endswith(('am', 'pm')):
+        text, meridiem = text[:-2], text[-2:]
+    hour, _, minute = text.partition(':')
+    hour, minute = int(hour), int(minute or 0)
+    if minute > 59:
+        raise ValueError('Invalid minutes')
+    if meridiem:
+        if not 1 <= hour <= 12:
+            raise ValueError('Invalid hour')
+        hour = hour % 12 + (12 if meridiem == 'pm' else 0)
+    elif hour > 23:
+        raise ValueError('Invalid hour')
+    elif 1 <= hour <= 6 and not text.startswith('0'):
+        # Nobody books "at 3" for three in the morning
+        hour += 12
+    return hour, minute
+
+def _meridiem(text):
+    text = text.lower().replace('.', '')
+    return text[-2:] if text.endswith(('am', 'pm')) else None
+
+def _time_range(phrase, start_text, end_text):
+    """Start (hour, minute) and length in minutes of "2-3pm", "10am to 1pm" and the like."""
+    end = _clock(end_text)
+    start_meridiem = _meridiem(start_text)
+    # Plain "5-6" could be anything; it needs am/pm, a colon or a leading "from"
+    if (start_meridiem is None and _meridiem(end_text) is None and ':' not in start_text
+            and not phrase.lower().startswith('from')):
+        raise ValueError('Not a time range')
+    # "2-3pm": the start borrows the end's am/pm unless that puts it after the end
+    start = _clock(start_text, start_meridiem or _meridiem(end_text))
+    if start_meridiem is None and start > end:
+        start = (start[0] - 12, start[1]) if start[0] >= 12 else start
+    minutes = (end[0] * 60 + end[1]) - (start[0] * 60 + start[1])
+    if minutes <= 0:
+        minutes += 24 * 60
+    return start, minutes
+
+def _duration(groups):
+    if groups['duration_half']:
+        return 30
+    if groups['duration_one']:
+        return 60
+    if groups['duration_minutes']:
+        return int(groups['duration_minutes'])
+    return round(float(groups['duration_hours']) * 60) + int(groups['duration_extra'] or 0)
+
+def _recurrence(groups):
+    """RRULE for an "every ..." phrase."""
+    word = groups['recurrence_word']
+    if word:
+        return f'FREQ={word.upper()}'
+    interval = _count(groups['recurrence_interval']) if groups['recurrence_interval'] else 1
+    unit = groups['recurrence_unit'].lower()
+    suffix = f';INTERVAL={interval}' if interval != 1 else ''
+    if unit == 'weekday':
+        return f'FREQ=WEEKLY{suffix};BYDAY=MO,TU,WE,TH,FR'
+    for freq in ('day', 'week', 'month', 'year'):
+        if unit.rstrip('s') == freq:
+            return f"FREQ={'DAILY' if freq == 'day' else freq.upper() + 'LY'}{suffix}"
+    days = sorted({WEEKDAYS[name] for name in re.findall(_DAY_ANY, unit)})
+    return f"FREQ=WEEKLY{suffix};BYDAY={','.join(RRULE_DAYS[day] for day in days)}"
+
+def parse_event(text, today=None):
+    """Parse one line of quick-add text into event fields.
+
+    Returns a dict with `title` and `date` (YYYY-MM-DD) plus whichever of
+    `time` (HH:MM), `duration` (minutes), `priority`, `category` and `rrule`
+    the line mentions. A phrase repeated later in the line (a second date, say)
+    is left in the title. Raises ValueError if no title is left.
+    """
+    today = today or date.today()
+    text = (text or '')[:MAX_LINE_LENGTH]
+    event = {}
+    kept = []
+    position = 0
+    # "tonight at 7" means 19:00; only a clock time without am/pm is moved
+    evening = False
+    plain_clock = False
+
+    for match in _PATTERN.finditer(text):
+        kind = match.lastgroup
+        groups = match.groupdict()
+        try:
+            if kind in ('iso', 'numeric', 'month_day', 'day_month', 'relative', 'weekday', 'offset'):
+                if 'date' in event:
+                    continue
+                event['date'] = resolve_date(kind, groups, today)
+                evening = kind == 'relative' and groups['relative_word'].lower() == 'tonight'
+            elif kind == 'range':
+                if 'time' in event:
+                    continue
+                (hour, minute), minutes = _time_range(groups['range'], groups['range_start'], groups['range_end'])
+                event['time'] = f'{hour:02d}:{minute:02d}'
+                event.setdefault('duration', minutes)
+            elif kind == 'time':
+                if 'time' in event:
+                    continue
+                word = (groups['time_word'] or '').lower()
+                if word:
+                    hour, minute = (12, 0) if word == 'noon' else (0, 0)
+                else:
+                    hour, minute = _clock(groups['time_ampm'] or groups['time_at'] or groups['time_clock'])
+                    plain_clock = not groups['time_ampm']
+                event['time'] = f'{hour:02d}:{minute:02d}'
+            elif kind == 'duration':
+                if 'duration' in event:
+                    continue
+                event['duration'] = _duration(groups)
+            elif kind == 'recurrence':
+                if 'rrule' in event:
+                    continue
+                event['rrule'] = _recurrence(groups)
+            elif kind == 'tag':
+                if 'category' in event:
+                    continue
+                event['category'] = groups['tag_name'].lower()
+            elif kind == 'priority':
+                if 'priority' in event:
+                    continue
+                event['priority'] = PRIORITIES[(groups['priority_word'] or groups['priority_bangs']).lower()]
+        except (ValueError, KeyError):
+            # Looked like a phrase but isn't a valid one ("at 25", "feb 30"); keep it as text
+            continue
+        kept.append(text[position:match.start()])
+        position = match.end()
+    kept.append(text[position:])
+
+    if evening and plain_clock and event['time'] < '12:00':
+        event['time'] = f"{int(event['time'][:2]) + 12:02d}{event['time'][2:]}"
+
+    title = _DANGLING.sub('', _SPACES.sub(' ', ' '.join(kept)).strip())
+    if not title:
+        raise ValueError('No title left after reading the date and time')
+    event['title'] = title
+
+    if 'date' not in event:
+        event['date'] = today
+        rrule = event.get('rrule', '')
+        if 'BYDAY=' in rrule:
+            # A weekly series starts on its first listed weekday
+            first_day = RRULE_DAYS.index(rrule.split('BYDAY=')[1].split(',')[0])
+            event['date'] = today + timedelta(days=(first_day - today.weekday()) % 7)
+    event['date'] = event['date'].isoformat()
+    return event
+
+def parse_events(lines, today=None):
+    """Parse many lines; each result is the parsed fields or {'error': ...}. Blank lines are skipped."""
+    today = today or date.today()
+    results = []
+    for line in lines:
+        if not line or not line.strip():
+            continue
+        try:
+            results.append(parse_event(line, today))
+        except ValueError as e:
+            results.append({'text': line, 'error': str(e)})
+    return results
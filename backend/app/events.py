@@ -1,8 +1,22 @@
-from datetime import datetime
+import base64
+import json
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne, DeleteOne
+from .serialization import event_json_projection
+from .recurrence import parse_rrule, expand_series, default_window, with_occurrences
+from .search import with_title_terms
 from .database import (
     create_event,
     get_events_by_user,
+    get_series_by_user,
+    summarize_events_by_user,
     get_event_by_id,
+    get_event_owners,
+    bulk_write_events,
+    reserved_event_seqs,
+    stamp_event_seqs,
+    add_tombstones,
     update_event,
     delete_event
 )
@@ -19,21 +33,151 @@ def create_new_event(user_id, title, description, date, time, priority, category
         'category': category,
         'created_at': datetime.utcnow()
     }
-    return create_event(event_data)
+    return create_event(with_title_terms(event_data))
 
-def get_user_events(user_id, start_date=None, end_date=None):
-    """Get all events for a user, optionally filtered by date range."""
-    events = get_events_by_user(user_id)
-    
-    if start_date and end_date:
-        start = datetime.fromisoformat(start_date)
-        end = datetime.fromisoformat(end_date)
-        events = [
-            event for event in events
-            if start <= datetime.fromisoformat(event['date']) <= end
+# Upper bound on a single page of events
+MAX_PAGE_SIZE = 500
+
+def _to_datetime(value):
+    """Accept either a datetime or an ISO-8601 string."""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+def sort_key(event):
+    """The (date, _id) pair events are listed and paged by.
+
+    Accepts stored documents and API-shaped ones (event_id, possibly string
+    dates); an occurrence of a series sorts by its series' _id.
+    """
+    date = _to_datetime(event['date'])
+    if 'series_id' in event:
+        return date, event['series_id']
+    event_id = event['event_id'] if 'event_id' in event else event['_id']
+    return date, event_id if isinstance(event_id, ObjectId) else ObjectId(event_id)
+
+def encode_cursor(event):
+    """Build an opaque paging cursor from the last event of a page."""
+    date, event_id = sort_key(event)
+    raw = json.dumps([date.isoformat(), str(event_id)])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Turn a paging cursor back into a (date, _id) pair. Raises ValueError if malformed."""
+    try:
+        date, event_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(date), ObjectId(event_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+# Fields a client may ask for with `fields=`
+EVENT_FIELDS = {
+    'user_id', 'title', 'description', 'date', 'time', 'duration', 'end', 'priority',
+    'category', 'participants', 'uid', 'created_at', 'updated_seq'
+}
+
+# Named field sets; "summary" is what the month grid shows
+FIELD_PROFILES = {
+    'summary': ['title', 'date', 'time', 'category', 'priority']
+}
+
+def event_projection(fields=None, as_strings=False):
+    """Turn a `fields=` value (a profile name or comma-separated fields) into a projection.
+
+    The projection returns events in their API shape (see event_json_projection);
+    no value means every field. `date` is always included because paging
+    cursors are built from it. Raises ValueError on an unknown field.
+    """
+    if not fields:
+        names = sorted(EVENT_FIELDS)
+    else:
+        names = FIELD_PROFILES.get(fields) or [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in names if name not in EVENT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return event_json_projection(list(dict.fromkeys(['date'] + names)), as_strings)
+
+def get_user_events(user_id, start_date=None, end_date=None, limit=None, cursor=None, projection=None, raw=False):
+    """Get events for a user, optionally filtered by date range and paged.
+
+    Returns (events, next_cursor); next_cursor is None on the last page.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    start_date, end_date = _to_datetime(start_date), _to_datetime(end_date)
+    if limit:
+        limit = min(limit, MAX_PAGE_SIZE)
+    # Fetch one extra document to know whether another page exists
+    events = get_events_by_user(user_id, start_date, end_date, limit + 1 if limit else None, after,
+                                projection, raw, exclude_series=True)
+
+    # Recurring series are stored once and expanded only inside the window
+    series = get_series_by_user(user_id, start_date, end_date)
+    if series:
+        window_start, window_end = default_window(start_date, end_date)
+        fields = [name for name in projection if name not in ('_id', 'event_id')] if projection else None
+        occurrences = [
+            occurrence
+            for item in series
+            for occurrence in expand_series(item, window_start, window_end, fields)
+            if after is None or sort_key(occurrence) > after
         ]
-    
-    return events
+        events = sorted(list(events) + occurrences, key=sort_key)
+
+    if limit and len(events) > limit:
+        events = events[:limit]
+        return events, encode_cursor(events[-1])
+    return events, None
+
+def get_events_in_window(user_id, start_date, end_date=None):
+    """A user's events in a window, with each series replaced by its occurrences there. Unordered."""
+    events = get_events_by_user(user_id, start_date, end_date, exclude_series=True)
+    series = get_series_by_user(user_id, start_date, end_date)
+    window_start, window_end = default_window(start_date, end_date)
+    return events + list(with_occurrences(series, window_start, window_end))
+
+# Calendar summaries: bucket sizes, longest window, and titles kept per bucket
+SUMMARY_GRANULARITIES = ('day', 'week')
+MAX_SUMMARY_DAYS = 366
+SUMMARY_TOP = 3
+
+def summarize_events(user_id, start_date, end_date, granularity='day', top=SUMMARY_TOP):
+    """Per-day or per-week counts of a user's events in [start_date, end_date).
+
+    Each bucket has its start, a total, counts per category and per priority,
+    and the `top` earliest events (title, priority, time, date).
+    """
+    buckets = {}
+
+    def bucket_for(start):
+        return buckets.setdefault(start, {'start': start, 'total': 0, 'categories': {}, 'priorities': {}, 'top': []})
+
+    def add(bucket, category, priority, count):
+        bucket['total'] += count
+        bucket['categories'][category or 'none'] = bucket['categories'].get(category or 'none', 0) + count
+        bucket['priorities'][priority or 'none'] = bucket['priorities'].get(priority or 'none', 0) + count
+
+    for row in summarize_events_by_user(user_id, start_date, end_date, granularity, top):
+        bucket = bucket_for(row['_id'])
+        for part in row['breakdown']:
+            add(bucket, part.get('category'), part.get('priority'), part['count'])
+        bucket['top'] = row['top']
+
+    # Recurring series are expanded here rather than in the pipeline
+    series = get_series_by_user(user_id, start_date, end_date)
+    for item in series:
+        for occurrence in expand_series(item, start_date, end_date):
+            day = occurrence['date']
+            if day >= end_date:
+                continue
+            bucket = bucket_for(day if granularity == 'day' else day - timedelta(days=day.weekday()))
+            add(bucket, occurrence.get('category'), occurrence.get('priority'), 1)
+            bucket['top'].append({key: occurrence.get(key) for key in ('title', 'priority', 'time', 'date')})
+
+    summary = sorted(buckets.values(), key=lambda bucket: bucket['start'])
+    if series:
+        for bucket in summary:
+            bucket['top'] = sorted(bucket['top'], key=lambda entry: (entry['date'], entry.get('time') or ''))[:top]
+    return summary
 
 def get_single_event(event_id):
     """Get a single event by ID."""
@@ -66,4 +210,154 @@ def remove_event(event_id, user_id):
         return "Unauthorized"
     
     delete_event(event_id)
-    return None 
\ No newline at end of file
+    return None
+
+def build_event_document(user_id, record):
+    """Validate client-supplied fields and build the event document to store."""
+    if not record.get('title'):
+        raise ValueError("title is required")
+    if not record.get('date'):
+        raise ValueError("date is required")
+    document = {
+        'user_id': user_id,
+        'title': record['title'],
+        'description': record.get('description') or '',
+        'date': datetime.fromisoformat(record['date']),
+        'time': record.get('time'),
+        'priority': record.get('priority'),
+        'category': record.get('category'),
+        'created_at': datetime.utcnow()
+    }
+    if record.get('duration'):
+        document['duration'] = int(record['duration'])
+    if record.get('uid'):
+        document['uid'] = str(record['uid'])
+    document.update(recurrence_fields(record))
+    return with_title_terms(document)
+
+# Fields one occurrence of a series may override
+OVERRIDE_FIELDS = ('title', 'description', 'time', 'duration', 'priority', 'category')
+
+def recurrence_fields(record):
+    """Parse `rrule` and `exdates` from client input into stored fields. Raises ValueError."""
+    fields = {}
+    if record.get('rrule'):
+        fields['recurrence'] = parse_rrule(record['rrule'])
+    if record.get('exdates'):
+        fields['exdates'] = sorted({datetime.fromisoformat(str(day)[:10]) for day in record['exdates']})
+    return fields
+
+# Most operations accepted by a single batch request
+MAX_BATCH_OPERATIONS = 1000
+
+# Fields a client may never change on an existing event; overrides have their
+# own endpoint
+PROTECTED_FIELDS = ('_id', 'user_id', 'created_at', 'recurrence', 'overrides', 'title_terms')
+
+def clean_event_changes(changes):
+    """Drop protected fields from a client update and parse the date and recurrence."""
+    changes = {k: v for k, v in changes.items() if k not in PROTECTED_FIELDS}
+    if isinstance(changes.get('date'), str):
+        changes['date'] = datetime.fromisoformat(changes['date'])
+    if changes.get('rrule') or changes.get('exdates'):
+        changes.update(recurrence_fields(changes))
+    changes.pop('rrule', None)
+    # A new title needs new autocomplete terms
+    return with_title_terms(changes)
+
+def _batch_request(user_id, operation, event_id, owners):
+    """Turn one batch operation into a bulk write request.
+
+    Returns (request, event_id, fields) where `fields` is the dict that will be
+    written (None for deletes). Raises ValueError/PermissionError/LookupError
+    for operations that must be rejected.
+    """
+    op = operation.get('op')
+    if op == 'create':
+        document = build_event_document(user_id, operation.get('event') or {})
+        document['_id'] = ObjectId()
+        return InsertOne(document), document['_id'], document
+    if op not in ('update', 'delete'):
+        raise ValueError('op must be create, update or delete')
+
+    if event_id not in owners:
+        raise LookupError('Event not found')
+    if owners[event_id] != user_id:
+        raise PermissionError('Unauthorized')
+
+    # Keep the owner in the filter so the write stays scoped to this user
+    owner_filter = {'_id': event_id, 'user_id': user_id}
+    if op == 'delete':
+        return DeleteOne(owner_filter), event_id, None
+    changes = clean_event_changes(operation.get('changes') or {})
+    if not changes:
+        raise ValueError('No changes given')
+    return UpdateOne(owner_filter, {'$set': changes}), event_id, changes
+
+def apply_event_batch(user_id, operations, ordered=True):
+    """Run a list of create/update/delete operations in one bulk write.
+
+    Ownership of every referenced event is checked with a single $in query.
+    Returns one result dict per operation, in order. In an ordered batch,
+    nothing after the first failure is attempted.
+    """
+    results = [None] * len(operations)
+
+    targets = {}
+    for position, operation in enumerate(operations):
+        if operation.get('op') in ('update', 'delete'):
+            try:
+                targets[position] = ObjectId(operation.get('event_id'))
+            except Exception:
+                targets[position] = None
+    owners = get_event_owners({t for t in targets.values() if t})
+
+    requests = []
+    positions = []
+    ids = []
+    written = []
+    for position, operation in enumerate(operations):
+        try:
+            if position in targets and targets[position] is None:
+                raise ValueError('Invalid event_id')
+            request, event_id, fields = _batch_request(user_id, operation, targets.get(position), owners)
+        except (TypeError, ValueError) as e:
+            results[position] = {'status': 400, 'error': str(e)}
+        except LookupError as e:
+            results[position] = {'status': 404, 'error': str(e)}
+        except PermissionError as e:
+            results[position] = {'status': 403, 'error': str(e)}
+        else:
+            requests.append(request)
+            positions.append(position)
+            ids.append(event_id)
+            if fields is not None:
+                written.append(fields)
+            continue
+        if ordered:
+            break
+
+    # Stamp change sequence numbers on everything written, in one counter round trip
+    if written:
+        with reserved_event_seqs(user_id, len(written)) as last:
+            stamp_event_seqs(written, last)
+            errors = bulk_write_events(requests, ordered)
+    else:
+        errors = bulk_write_events(requests, ordered) if requests else {}
+    deleted = []
+
+    for index, position in enumerate(positions):
+        if index in errors:
+            results[position] = {'status': 400, 'error': errors[index]}
+            if ordered:
+                break
+            continue
+        op = operations[position].get('op')
+        if op == 'delete':
+            deleted.append(ids[index])
+        results[position] = {'status': 201 if op == 'create' else 200, 'event_id': str(ids[index])}
+
+    # Leave tombstones for the change feed
+    add_tombstones(user_id, deleted)
+
+    return [result or {'status': 424, 'error': 'Not attempted'} for result in results]
@@ -0,0 +1,129 @@
+import math
+import os
+import threading
+import time
+import bcrypt
+from concurrent.futures import ThreadPoolExecutor
+from .metrics import observe, BCRYPT_SECONDS, BCRYPT_WAIT, BCRYPT_REJECTED
+
+# Under gevent, hashing runs on its own small pool of OS threads so a burst of
+# logins can't stall every greenlet; past MAX_PENDING queued jobs new ones are
+# refused. Thread workers (sync, gthread) hash on the request's own thread,
+# which waits either way, and only the MAX_PENDING bound applies.
+BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+BCRYPT_MAX_PENDING = int(os.getenv('BCRYPT_MAX_PENDING', '64'))
+
+# Cost factor: fixed with BCRYPT_ROUNDS, otherwise calibrated at startup so one
+# hash takes about BCRYPT_TARGET_MS on this machine
+BCRYPT_TARGET_MS = float(os.getenv('BCRYPT_TARGET_MS', '250'))
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+DEFAULT_ROUNDS = 12
+
+class HasherBusy(Exception):
+    """Too many password hashes are already queued."""
+
+def _make_executor(workers):
+    """gevent's pool of real OS threads when gevent has patched threading, else None.
+
+    A greenlet running bcrypt would block the event loop, so it has to be handed
+    to a real thread; a request thread gains nothing by handing it off and waiting.
+    """
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+            return GeventThreadPoolExecutor(max_workers=workers)
+    except ImportError:
+        pass
+    return None
+
+class PasswordHasher:
+    """Runs bcrypt with a bound on pending jobs (on a thread pool under gevent) and keeps queue and timing statistics."""
+
+    def __init__(self, workers=BCRYPT_WORKERS, max_pending=BCRYPT_MAX_PENDING, rounds=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds or int(os.getenv('BCRYPT_ROUNDS', DEFAULT_ROUNDS))
+        self._executor = None
+        self._executor_ready = False
+        self._lock = threading.Lock()
+        self.stats = {
+            'pending': 0,
+            'max_pending_seen': 0,
+            'completed': 0,
+            'rejected': 0,
+            'hash_seconds_total': 0.0,
+            'wait_seconds_total': 0.0
+        }
+
+    def _run(self, operation, func, *args):
+        with self._lock:
+            if not self._executor_ready:
+                self._executor = _make_executor(self.workers)
+                self._executor_ready = True
+            if self.stats['pending'] >= self.max_pending:
+                self.stats['rejected'] += 1
+                BCRYPT_REJECTED.inc()
+                raise HasherBusy('Too many password operations in progress')
+            self.stats['pending'] += 1
+            self.stats['max_pending_seen'] = max(self.stats['max_pending_seen'], self.stats['pending'])
+
+        queued_at = time.perf_counter()
+
+        def job():
+            started_at = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                finished_at = time.perf_counter()
+                with self._lock:
+                    self.stats['wait_seconds_total'] += started_at - queued_at
+                    self.stats['hash_seconds_total'] += finished_at - started_at
+                observe(BCRYPT_WAIT, started_at - queued_at)
+                observe(BCRYPT_SECONDS, finished_at - started_at, operation)
+
+        try:
+            if self._executor is None:
+                return job()
+            return self._executor.submit(job).result()
+        finally:
+            with self._lock:
+                self.stats['pending'] -= 1
+                self.stats['completed'] += 1
+
+    def hash(self, password):
+        return self._run('hash', bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(self.rounds))
+
+    def verify(self, password, password_hash):
+        if isinstance(password_hash, str):
+            password_hash = password_hash.encode('utf-8')
+        return self._run('verify', bcrypt.checkpw, password.encode('utf-8'), password_hash)
+
+    def needs_rehash(self, password_hash):
+        """True if a stored hash uses a lower cost than the current one."""
+        return hash_rounds(password_hash) < self.rounds
+
+    def calibrate(self, target_ms=BCRYPT_TARGET_MS):
+        """Pick the cost factor whose hash time is closest to target_ms; returns it."""
+        if os.getenv('BCRYPT_ROUNDS'):
+            return self.rounds
+        probe_rounds = MIN_ROUNDS
+        started_at = time.perf_counter()
+        bcrypt.hashpw(b'calibration', bcrypt.gensalt(probe_rounds))
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        # Each extra round doubles the work
+        rounds = probe_rounds + round(math.log2(max(target_ms, 1) / max(elapsed_ms, 0.001)))
+        self.rounds = min(MAX_ROUNDS, max(MIN_ROUNDS, rounds))
+        return self.rounds
+
+def hash_rounds(password_hash):
+    """Read the cost factor out of a bcrypt hash ($2b$12$...)."""
+    if isinstance(password_hash, bytes):
+        password_hash = password_hash.decode('utf-8')
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return 0
+
+hasher = PasswordHasher()
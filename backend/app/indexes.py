@@ -0,0 +1,240 @@
+import argparse
+import hashlib
+import json
+import threading
+from datetime import datetime
+from pymongo import MongoClient
+from .database import (
+    MONGO_URI,
+    DB_NAME,
+    client_options,
+    get_db,
+    TOMBSTONE_RETENTION_DAYS,
+    USERNAME_COLLATION
+)
+
+# Bump when INDEX_SPEC changes shape; the fingerprint below also changes when a
+# setting such as the tombstone retention does
+INDEX_SPEC_VERSION = 5
+
+# collection -> indexes it should have. Each entry is (keys, options); the
+# index name is derived from the keys unless options give one.
+INDEX_SPEC = {
+    'users': [
+        ([('email', 1)], {'unique': True}),
+        # Usernames are unique and looked up regardless of case
+        ([('username', 1)], {'unique': True, 'collation': USERNAME_COLLATION, 'name': 'username_ci'})
+    ],
+    'events': [
+        # Serves list reads and their (date, _id) keyset pagination
+        ([('user_id', 1), ('date', 1), ('_id', 1)], {}),
+        ([('date', 1)], {}),
+        # Imported events keep their source UID; re-importing the same one is a no-op
+        ([('user_id', 1), ('uid', 1)], {'unique': True, 'partialFilterExpression': {'uid': {'$exists': True}}}),
+        ([('user_id', 1), ('updated_seq', 1)], {}),
+        # Attendee lookups for find-slot
+        ([('participants.email', 1), ('date', 1)], {}),
+        # Recurring series, fetched separately for expansion
+        ([('user_id', 1), ('date', 1), ('recurrence.until', 1)], {
+            'partialFilterExpression': {'recurrence': {'$exists': True}}
+        }),
+        # Keyword search. user_id comes first so a search only reads the
+        # user's own entries; text fields are listed in the order the server reports them
+        ([('user_id', 1), ('description', 'text'), ('title', 'text')], {
+            'weights': {'description': 1, 'title': 5}, 'default_language': 'english', 'name': 'events_text'
+        }),
+        # Type-ahead on title word prefixes, latest events first
+        ([('user_id', 1), ('title_terms', 1), ('date', -1), ('_id', -1)], {})
+    ],
+    'event_tombstones': [
+        ([('user_id', 1), ('updated_seq', 1)], {}),
+        # Tombstones are compacted by a TTL index once past retention
+        ([('deleted_at', 1)], {'expireAfterSeconds': TOMBSTONE_RETENTION_DAYS * 24 * 60 * 60})
+    ],
+    'revoked_tokens': [
+        # Revoked tokens are forgotten once they would have expired anyway
+        ([('expires_at', 1)], {'expireAfterSeconds': 0}),
+        ([('revoked_at', 1)], {})
+    ],
+    'tasks': [
+        ([('id', 1)], {'unique': True}),
+        ([('user_id', 1), ('status', 1)], {}),
+        ([('user_id', 1), ('priority', 1), ('due_date', 1)], {}),
+        # /api/tasks/next reads the first k entries
+        ([('user_id', 1), ('rank', -1)], {})
+    ]
+}
+
+# Options that make two indexes on the same keys different
+COMPARED_OPTIONS = ('unique', 'sparse', 'partialFilterExpression', 'expireAfterSeconds', 'collation',
+                    'weights', 'default_language')
+
+# Where the fingerprint of the last applied spec is kept
+META_COLLECTION = 'schema_meta'
+META_ID = 'indexes'
+
+def index_name(keys, options):
+    """The name an index is (or would be) created under."""
+    return options.get('name') or '_'.join(f'{field}_{direction}' for field, direction in keys)
+
+def spec_fingerprint():
+    """Hash of the spec, so a deployment can tell whether its indexes are current."""
+    raw = json.dumps([INDEX_SPEC_VERSION, INDEX_SPEC], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def _direction(direction):
+    # Indexes made from the shell report 1.0 rather than 1
+    return int(direction) if isinstance(direction, float) else direction
+
+def _keys_of(existing):
+    # A text index is reported as _fts/_ftsx keys plus weights; turn it back
+    # into the (field, 'text') form used in the spec
+    keys = []
+    for field, direction in existing['key'].items():
+        if field == '_fts':
+            keys.extend((name, 'text') for name in sorted(existing.get('weights', {})))
+        elif field != '_ftsx':
+            keys.append((field, _direction(direction)))
+    return keys
+
+def _options_of(existing):
+    options = {}
+    for option in COMPARED_OPTIONS:
+        if option not in existing:
+            continue
+        value = existing[option]
+        if option == 'collation':
+            # The server fills in every collation field; compare only the ones we set
+            value = {field: value.get(field) for field in USERNAME_COLLATION}
+        options[option] = value
+    return options
+
+def _wanted_options(options):
+    return {option: options[option] for option in COMPARED_OPTIONS if option in options}
+
+def plan_indexes(database):
+    """Diff INDEX_SPEC against the database.
+
+    Returns a list of (action, collection, name, keys, options) where action is
+    'create' (missing), 'ttl' (only expireAfterSeconds differs), 'drift' (same
+    name, different keys or options) or 'extra' (present but not in the spec).
+    """
+    plan = []
+    existing_collections = set(database.list_collection_names())
+    for collection, wanted in INDEX_SPEC.items():
+        existing = {}
+        if collection in existing_collections:
+            existing = {index['name']: index for index in database[collection].list_indexes()}
+        wanted_names = set()
+        for keys, options in wanted:
+            name = index_name(keys, options)
+            wanted_names.add(name)
+            current = existing.get(name)
+            if current is None:
+                plan.append(('create', collection, name, keys, options))
+                continue
+            current_keys = _keys_of(current)
+            current_options = _options_of(current)
+            wanted_options = _wanted_options(options)
+            if current_keys != keys:
+                plan.append(('drift', collection, name, keys, options))
+            elif current_options != wanted_options:
+                only_ttl = ({k: v for k, v in current_options.items() if k != 'expireAfterSeconds'} ==
+                            {k: v for k, v in wanted_options.items() if k != 'expireAfterSeconds'})
+                plan.append(('ttl' if only_ttl else 'drift', collection, name, keys, options))
+        for name, index in existing.items():
+            if name != '_id_' and name not in wanted_names:
+                plan.append(('extra', collection, name, list(index['key'].items()), {}))
+    return plan
+
+def apply_plan(database, plan, rebuild_drifted=False, drop_extra=False):
+    """Carry out a plan from plan_indexes. Returns the number of changes made."""
+    changes = 0
+    for action, collection, name, keys, options in plan:
+        try:
+            if action == 'create':
+                database[collection].create_index(keys, **dict(options, name=name))
+            elif action == 'ttl':
+                database.command('collMod', collection, index={
+                    'name': name, 'expireAfterSeconds': options['expireAfterSeconds']
+                })
+            elif action == 'drift' and rebuild_drifted:
+                database[collection].drop_index(name)
+                database[collection].create_index(keys, **dict(options, name=name))
+            elif action == 'extra' and drop_extra:
+                database[collection].drop_index(name)
+            else:
+                continue
+            changes += 1
+            print(f"Index {action}: {collection}.{name}")
+        except Exception as e:
+            print(f"Error applying index {collection}.{name}: {str(e)}")  # Add logging
+    return changes
+
+def indexes_current(database):
+    """True if the last spec applied to this database is the current one."""
+    meta = database[META_COLLECTION].find_one({'_id': META_ID})
+    return bool(meta) and meta.get('fingerprint') == spec_fingerprint()
+
+def sync_indexes(database):
+    """Build missing indexes and fix TTLs, then record the spec as applied if nothing is left over."""
+    plan = plan_indexes(database)
+    apply_plan(database, plan)
+    remaining = [step for step in plan_indexes(database) if step[0] in ('create', 'ttl')]
+    drifted = [f"{collection}.{name}" for action, collection, name, _, _ in plan if action == 'drift']
+    if drifted:
+        print(f"Index drift (run python -m app.indexes --rebuild-drifted): {', '.join(drifted)}")
+    if not remaining:
+        database[META_COLLECTION].update_one(
+            {'_id': META_ID},
+            {'$set': {'fingerprint': spec_fingerprint(), 'version': INDEX_SPEC_VERSION, 'applied_at': datetime.utcnow()}},
+            upsert=True
+        )
+    return plan
+
+def _sync_in_background():
+    # A client of its own, so a pre-forking server closing the shared pool in
+    # its master doesn't cut off a build that is still running
+    client = MongoClient(MONGO_URI, **client_options())
+    try:
+        sync_indexes(client[DB_NAME])
+    except Exception as e:
+        print(f"Error syncing indexes: {str(e)}")  # Add logging
+    finally:
+        client.close()
+
+def ensure_indexes(background=True):
+    """Startup hook: nothing to do when indexes match the spec, otherwise build what is missing.
+
+    With background=True the builds run on a thread so startup isn't held up.
+    """
+    if indexes_current(get_db()):
+        return None
+    if not background:
+        return sync_indexes(get_db())
+    thread = threading.Thread(target=_sync_in_background, name='index-sync', daemon=True)
+    thread.start()
+    return thread
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the index spec with the database and build what is missing.')
+    parser.add_argument('--check', action='store_true', help='only print the plan')
+    parser.add_argument('--rebuild-drifted', action='store_true', help='drop and recreate indexes whose definition changed')
+    parser.add_argument('--drop-extra', action='store_true', help='drop indexes that are not in the spec')
+    args = parser.parse_args(argv)
+
+    database = get_db()
+    plan = plan_indexes(database)
+    for action, collection, name, keys, options in plan:
+        print(f"{action:7} {collection}.{name} {keys}")
+    if not plan:
+        print("Indexes match the spec")
+    if args.check:
+        return 1 if any(step[0] != 'extra' for step in plan) else 0
+
+    apply_plan(database, plan, rebuild_drifted=args.rebuild_drifted, drop_extra=args.drop_extra)
+    sync_indexes(database)
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
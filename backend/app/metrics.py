@@ -0,0 +1,152 @@
+import os
+import time
+from flask import Response, g, request
+from pymongo import monitoring
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess
+)
+
+# Under gunicorn, PROMETHEUS_MULTIPROC_DIR is set (see gunicorn.conf.py) and each
+# worker writes its samples to memory-mapped files there; /metrics on any worker
+# reads them all, so scrapes see totals for the whole server.
+MULTIPROCESS = bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+# Optional bearer token required to read /metrics
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Request latencies are mostly milliseconds; the tail goes up to a few seconds
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+HASH_BUCKETS = (.01, .025, .05, .1, .25, .5, 1, 2.5, 5)
+
+HTTP_REQUESTS = Counter(
+    'http_requests_total', 'HTTP requests handled', ['method', 'route', 'status'])
+HTTP_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time to produce a response', ['method', 'route'],
+    buckets=LATENCY_BUCKETS)
+MONGO_LATENCY = Histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command round trip time',
+    ['collection', 'command', 'outcome'], buckets=LATENCY_BUCKETS)
+MONGO_CHECKOUT_WAIT = Histogram(
+    'mongodb_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection',
+    ['outcome'], buckets=LATENCY_BUCKETS)
+BCRYPT_SECONDS = Histogram(
+    'bcrypt_duration_seconds', 'Time spent hashing or checking a password', ['operation'],
+    buckets=HASH_BUCKETS)
+BCRYPT_WAIT = Histogram(
+    'bcrypt_queue_wait_seconds', 'Time a password operation waited for a hashing thread',
+    buckets=LATENCY_BUCKETS)
+BCRYPT_REJECTED = Counter(
+    'bcrypt_rejected_total', 'Password operations refused because the hashing queue was full')
+JWT_SECONDS = Histogram(
+    'jwt_verify_duration_seconds', 'Time to verify a token', ['cache'],
+    buckets=(.00001, .000025, .00005, .0001, .00025, .0005, .001, .0025, .005))
+
+# Labelled children are looked up once and reused, which keeps an observation
+# to a dictionary hit plus the sample update
+_children = {}
+
+def _child(metric, *labels):
+    key = (metric, labels)
+    child = _children.get(key)
+    if child is None:
+        child = _children[key] = metric.labels(*labels)
+    return child
+
+def observe(metric, seconds, *labels):
+    """Record a duration on a histogram, with label values if it has any."""
+    (_child(metric, *labels) if labels else metric).observe(seconds)
+
+class CommandTimer(monitoring.CommandListener):
+    """Times every MongoDB command by collection and command name."""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        # Only the started event carries the command body, where the collection is named
+        collection = event.command.get(event.command_name)
+        self._collections[event.request_id] = collection if isinstance(collection, str) else ''
+
+    def succeeded(self, event):
+        self._record(event, 'success')
+
+    def failed(self, event):
+        self._record(event, 'failure')
+
+    def _record(self, event, outcome):
+        collection = self._collections.pop(event.request_id, '')
+        observe(MONGO_LATENCY, event.duration_micros / 1e6, collection, event.command_name, outcome)
+
+class PoolTimer(monitoring.ConnectionPoolListener):
+    """Times connection checkouts from the pool; the rest of the pool events are ignored."""
+
+    def connection_checked_out(self, event):
+        observe(MONGO_CHECKOUT_WAIT, event.duration, 'success')
+
+    def connection_check_out_failed(self, event):
+        observe(MONGO_CHECKOUT_WAIT, event.duration, 'failure')
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+def mongo_listeners():
+    """Listeners to pass to every MongoClient."""
+    return [CommandTimer(), PoolTimer()]
+
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+def _record_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Label by the URL rule, not the path, so IDs don't explode the series count
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        observe(HTTP_LATENCY, time.perf_counter() - started, request.method, route)
+        _child(HTTP_REQUESTS, request.method, route, str(response.status_code)).inc()
+    return response
+
+def metrics_view():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+def init_metrics(app):
+    """Time every request and serve the metrics at /metrics."""
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
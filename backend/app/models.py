@@ -51,7 +51,7 @@ class Participant:
         )
 
 class Event:
-    def __init__(self, title, description, date, time, priority, category, user_id):
+    def __init__(self, title, description, date, time, priority, category, user_id, duration=None):
         self.title = title
         self.description = description
         self.date = date
@@ -59,6 +59,7 @@ class Event:
         self.priority = priority
         self.category = category
         self.user_id = user_id
+        self.duration = duration  # minutes
         self.created_at = datetime.utcnow()
     
     def to_dict(self):
@@ -70,6 +71,7 @@ class Event:
             'priority': self.priority,
             'category': self.category,
             'user_id': self.user_id,
+            'duration': self.duration,
             'created_at': self.created_at
         }
     
@@ -82,5 +84,6 @@ class Event:
             time=data.get('time'),
             priority=data.get('priority'),
             category=data.get('category'),
-            user_id=data.get('user_id')
+            user_id=data.get('user_id'),
+            duration=data.get('duration')
         ) 
\ No newline at end of file
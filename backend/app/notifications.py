@@ -0,0 +1,175 @@
+import json
+import os
+import queue
+import threading
+import time
+from .database import db, events_collection, tombstones_collection
+
+# "local" delivers writes made by this process only, which suits the single
+# process of run.py; "mongo" follows a MongoDB change stream so every process
+# sees every write (needs a replica set). gunicorn.conf.py defaults to "mongo"
+# and refuses "local" with more than one worker.
+EVENT_HUB = os.getenv('EVENT_HUB', 'local')
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_SECONDS = 15
+
+# Messages buffered per connection before it is told to resync instead
+SUBSCRIBER_QUEUE_SIZE = 100
+
+class LocalHub:
+    """In-process pub/sub of per-user event notifications."""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """Register a connection and return the queue its messages arrive on."""
+        inbox = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(inbox)
+        return inbox
+
+    def unsubscribe(self, user_id, inbox):
+        with self._lock:
+            inboxes = self._subscribers.get(user_id)
+            if inboxes:
+                inboxes.discard(inbox)
+                if not inboxes:
+                    del self._subscribers[user_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(inboxes) for inboxes in self._subscribers.values())
+
+    def deliver(self, user_id, message):
+        """Hand a message to every connection the user has open in this process."""
+        with self._lock:
+            inboxes = list(self._subscribers.get(user_id, ()))
+        for inbox in inboxes:
+            try:
+                inbox.put_nowait(message)
+            except queue.Full:
+                # A slow client gets one resync notice instead of a backlog
+                _drain(inbox)
+                try:
+                    inbox.put_nowait({'type': 'resync'})
+                except queue.Full:
+                    # Another writer refilled it first; the client already has to resync
+                    pass
+
+    def publish(self, user_id, message):
+        """Called by write paths after a change to a user's events."""
+        self.deliver(user_id, message)
+
+class MongoChangeStreamHub(LocalHub):
+    """Hub fed by a MongoDB change stream, so writes from any process reach every subscriber.
+
+    Write paths' own publish calls are ignored; the change stream delivers them.
+    """
+
+    def __init__(self, database):
+        super().__init__()
+        self._database = database
+        self._watcher = None
+        self._watcher_lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        self._ensure_watcher()
+        return super().subscribe(user_id)
+
+    def publish(self, user_id, message):
+        pass
+
+    def _ensure_watcher(self):
+        with self._watcher_lock:
+            if self._watcher is None or not self._watcher.is_alive():
+                self._watcher = threading.Thread(target=self._watch, name='event-change-stream', daemon=True)
+                self._watcher.start()
+
+    def _watch(self):
+        pipeline = [{'$match': {
+            'ns.coll': {'$in': [events_collection.name, tombstones_collection.name]},
+            'operationType': {'$in': ['insert', 'update', 'replace']}
+        }}]
+        resume_token = None
+        while True:
+            try:
+                with self._database.watch(pipeline, full_document='updateLookup',
+                                          resume_after=resume_token) as stream:
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        self._forward(change)
+            except Exception as e:
+                print(f"Event change stream interrupted: {str(e)}")  # Add logging
+                time.sleep(1)
+
+    def _forward(self, change):
+        document = change.get('fullDocument')
+        if not document or 'user_id' not in document:
+            return
+        if change['ns']['coll'] == tombstones_collection.name:
+            message = {'type': 'change', 'op': 'delete', 'event_ids': [str(document['event_id'])]}
+        else:
+            op = 'create' if change['operationType'] == 'insert' else 'update'
+            message = {'type': 'change', 'op': op, 'event_ids': [str(document['_id'])]}
+        self.deliver(document['user_id'], message)
+
+def _drain(inbox):
+    try:
+        while True:
+            inbox.get_nowait()
+    except queue.Empty:
+        pass
+
+_hub = None
+_hub_lock = threading.Lock()
+
+def get_hub():
+    """Return the process-wide hub, creating it on first use."""
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = MongoChangeStreamHub(db) if EVENT_HUB == 'mongo' else LocalHub()
+        return _hub
+
+def publish_event_change(user_id, op, event_ids=()):
+    """Tell the user's open streams that their events changed.
+
+    Called after the write is committed, so a failure here is logged and never
+    fails the write.
+    """
+    try:
+        get_hub().publish(user_id, {'type': 'change', 'op': op, 'event_ids': [str(i) for i in event_ids]})
+    except Exception as e:
+        print(f"Error in publish_event_change: {str(e)}")  # Add logging
+
+def _format(message):
+    return f"event: {message['type']}\ndata: {json.dumps(message)}\n\n"
+
+def event_stream(user_id, heartbeat=HEARTBEAT_SECONDS, still_valid=None):
+    """Yield Server-Sent Events for a user until the client disconnects.
+
+    Blocking waits happen on a queue, so under a cooperative worker (gevent)
+    each idle connection costs a greenlet rather than an OS thread. When
+    `still_valid` returns false, at least once per heartbeat, the stream sends
+    an `expired` event and ends.
+    """
+    hub = get_hub()
+    inbox = hub.subscribe(user_id)
+    try:
+        # Ask browsers to reconnect after 5s if the connection drops
+        yield 'retry: 5000\n\n'
+        while True:
+            if still_valid and not still_valid():
+                yield _format({'type': 'expired'})
+                return
+            try:
+                message = inbox.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ': heartbeat\n\n'
+                continue
+            yield _format(message)
+    finally:
+        hub.unsubscribe(user_id, inbox)
@@ -0,0 +1,211 @@
+import calendar
+from datetime import datetime, timedelta
+from .cache import LRUCache
+
+# Supported subset of RFC 5545 RRULE: FREQ, INTERVAL, COUNT, UNTIL, and BYDAY
+# for weekly rules. Occurrences are whole days, like the `date` field itself.
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+MAX_COUNT = 1000
+
+# Series without an end are expanded this far ahead when a read has no window
+RECURRENCE_HORIZON_DAYS = 365
+
+# (series _id, updated_seq, window) -> occurrence dates. The sequence number
+# changes on every write to the series, so stale expansions are never reused.
+EXPANSION_CACHE_SIZE = 4096
+_expansions = LRUCache(EXPANSION_CACHE_SIZE, 3600)
+
+def _parse_until(value):
+    if isinstance(value, datetime):
+        return value
+    value = value.rstrip('Z')
+    if 'T' in value and '-' not in value:
+        return datetime.strptime(value, '%Y%m%dT%H%M%S')
+    if '-' not in value:
+        return datetime.strptime(value, '%Y%m%d')
+    return datetime.fromisoformat(value)
+
+def parse_rrule(value):
+    """Parse an RRULE string ("FREQ=WEEKLY;BYDAY=MO,WE") or dict into a stored rule.
+
+    Raises ValueError for anything outside the supported subset.
+    """
+    if isinstance(value, dict):
+        parts = {str(key).upper(): val for key, val in value.items()}
+    else:
+        value = str(value).strip()
+        if value.upper().startswith('RRULE:'):
+            value = value[6:]
+        try:
+            parts = dict(part.split('=', 1) for part in value.split(';') if part)
+        except ValueError:
+            raise ValueError('Invalid RRULE')
+        parts = {key.upper(): val for key, val in parts.items()}
+
+    freq = str(parts.pop('FREQ', '')).upper()
+    if freq not in FREQUENCIES:
+        raise ValueError(f"FREQ must be one of {', '.join(FREQUENCIES)}")
+    rule = {'freq': freq, 'interval': int(parts.pop('INTERVAL', 1))}
+    if rule['interval'] < 1:
+        raise ValueError('INTERVAL must be positive')
+
+    if 'COUNT' in parts:
+        rule['count'] = int(parts.pop('COUNT'))
+        if not 1 <= rule['count'] <= MAX_COUNT:
+            raise ValueError(f'COUNT must be between 1 and {MAX_COUNT}')
+    if 'UNTIL' in parts:
+        rule['until'] = _parse_until(parts.pop('UNTIL')).replace(hour=0, minute=0, second=0, microsecond=0)
+    if 'count' in rule and 'until' in rule:
+        raise ValueError('COUNT and UNTIL cannot both be set')
+
+    if 'BYDAY' in parts:
+        days = parts.pop('BYDAY')
+        days = days.split(',') if isinstance(days, str) else list(days)
+        days = [day.strip().upper() for day in days]
+        if freq != 'WEEKLY' or any(day not in WEEKDAYS for day in days):
+            raise ValueError('BYDAY is only supported as a list of weekdays on WEEKLY rules')
+        rule['byday'] = sorted(set(days), key=WEEKDAYS.index)
+
+    if parts:
+        raise ValueError(f"Unsupported RRULE parts: {', '.join(sorted(parts))}")
+    return rule
+
+def format_rrule(rule):
+    """Render a stored rule back as an RRULE value."""
+    parts = [f"FREQ={rule['freq']}"]
+    if rule.get('interval', 1) != 1:
+        parts.append(f"INTERVAL={rule['interval']}")
+    if rule.get('byday'):
+        parts.append(f"BYDAY={','.join(rule['byday'])}")
+    if rule.get('count'):
+        parts.append(f"COUNT={rule['count']}")
+    if rule.get('until'):
+        parts.append(f"UNTIL={rule['until'].strftime('%Y%m%d')}")
+    return ';'.join(parts)
+
+def _add_months(day, months):
+    """Same day-of-month `months` later, or None if that month is too short."""
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    if day.day > calendar.monthrange(year, month)[1]:
+        return None
+    return day.replace(year=year, month=month)
+
+def _period(start, rule, k):
+    """Occurrence dates in the k-th period of a series (before COUNT/UNTIL)."""
+    interval = rule.get('interval', 1)
+    freq = rule['freq']
+    if freq == 'DAILY':
+        return [start + timedelta(days=k * interval)]
+    if freq == 'WEEKLY':
+        week_start = start - timedelta(days=start.weekday()) + timedelta(weeks=k * interval)
+        days = rule.get('byday') or [WEEKDAYS[start.weekday()]]
+        return [week_start + timedelta(days=WEEKDAYS.index(day)) for day in days]
+    day = _add_months(start, k * interval * (12 if freq == 'YEARLY' else 1))
+    return [day] if day else []
+
+def _first_period(start, rule, after):
+    """A period index at or before the one containing `after`, so expansion can skip ahead."""
+    interval = rule.get('interval', 1)
+    freq = rule['freq']
+    if freq == 'DAILY':
+        periods = (after - start).days // interval
+    elif freq == 'WEEKLY':
+        periods = (after - start).days // (7 * interval)
+    elif freq == 'MONTHLY':
+        periods = ((after.year - start.year) * 12 + after.month - start.month) // interval
+    else:
+        periods = (after.year - start.year) // interval
+    return max(0, periods - 1)
+
+def iter_occurrences(start, rule, after=None):
+    """Yield the series' occurrence dates in order, from `after` on if given.
+
+    Lazy: callers stop iterating once past their window. Series with a COUNT are
+    walked from the start, since earlier occurrences count towards it.
+    """
+    start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    until = rule.get('until')
+    remaining = rule.get('count')
+    k = 0
+    if after and after > start and remaining is None:
+        k = _first_period(start, rule, after)
+    # A period may be empty (the 31st in a short month) but never many in a row
+    empty_streak = 0
+    while empty_streak < 48:
+        days = [day for day in _period(start, rule, k) if day >= start]
+        empty_streak = 0 if days else empty_streak + 1
+        for day in days:
+            if until and day > until:
+                return
+            if remaining is not None:
+                if remaining == 0:
+                    return
+                remaining -= 1
+            if after is None or day >= after:
+                yield day
+        k += 1
+
+def _day_key(day):
+    return day.strftime('%Y-%m-%d')
+
+def occurrence_dates(event, window_start, window_end):
+    """Dates of a series' occurrences in [window_start, window_end], without exdates. Memoized."""
+    key = (event['_id'], event.get('updated_seq'), window_start, window_end)
+    dates = _expansions.get(key)
+    if dates is None:
+        excluded = {_day_key(day) for day in event.get('exdates') or ()}
+        dates = []
+        for day in iter_occurrences(event['date'], event['recurrence'], window_start):
+            if day > window_end:
+                break
+            if _day_key(day) not in excluded:
+                dates.append(day)
+        _expansions.set(key, dates)
+    return dates
+
+def expand_series(event, window_start, window_end, fields=None):
+    """Yield one event per occurrence of a series inside the window.
+
+    Each occurrence has `event_id` "<series id>_<YYYYMMDD>", `series_id`, the
+    series' fields (or just `fields`) and any override stored for its date.
+    """
+    overrides = event.get('overrides') or {}
+    for day in occurrence_dates(event, window_start, window_end):
+        occurrence = {
+            name: value for name, value in event.items()
+            if name not in ('_id', 'recurrence', 'exdates', 'overrides', 'title_terms') and (fields is None or name in fields)
+        }
+        override = overrides.get(_day_key(day))
+        if override:
+            occurrence.update((name, value) for name, value in override.items() if fields is None or name in fields)
+        if isinstance(occurrence.get('end'), datetime):
+            # An explicit end moves along with the occurrence
+            occurrence['end'] += day - event['date'].replace(hour=0, minute=0, second=0, microsecond=0)
+        occurrence['date'] = day
+        occurrence['event_id'] = f"{event['_id']}_{day.strftime('%Y%m%d')}"
+        occurrence['series_id'] = event['_id']
+        occurrence['rrule'] = format_rrule(event['recurrence'])
+        yield occurrence
+
+def horizon_end():
+    """Where open-ended expansion stops. Whole days, so it stays a stable memo key all day."""
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today + timedelta(days=RECURRENCE_HORIZON_DAYS)
+
+def default_window(start, end):
+    """Fill in an open-ended read window for expansion purposes."""
+    if start is None:
+        start = datetime(1970, 1, 1)
+    if end is None:
+        end = horizon_end()
+    return start, end
+
+def with_occurrences(events, window_start, window_end):
+    """Yield plain events as they are and each series as its occurrences in the window."""
+    for event in events:
+        if event.get('recurrence'):
+            yield from expand_series(event, window_start, window_end)
+        else:
+            yield event
@@ -1,13 +1,44 @@
-from flask import Blueprint, request, jsonify, send_from_directory, current_app
+from flask import Blueprint, request, jsonify, send_from_directory, current_app, Response, stream_with_context
 import os
 import uuid
+import hashlib
 from werkzeug.utils import secure_filename
 from bson import ObjectId
-from datetime import datetime
+from pymongo.errors import ExecutionTimeout
+from datetime import date, datetime, timedelta
 
-from .database import users_collection, events_collection
+from .database import (
+    users_collection,
+    events_collection,
+    get_user_by_username,
+    get_user_by_id,
+    get_users_by_emails,
+    get_event_by_id,
+    get_events_by_user,
+    get_events_for_attendees,
+    iter_events_by_user,
+    add_event_exdate,
+    insert_events,
+    update_event_for_owner,
+    delete_event_for_owner,
+    event_exists,
+    reserved_event_seqs
+)
 from .models import User, Event, Participant
-from .auth import token_required, hash_password, verify_password, generate_token
+from .auth import token_required, hash_password, verify_password, generate_token, revoke_token, get_request_token, password_needs_rehash, generate_stream_ticket, stream_session, session_active, STREAM_TICKET_SECONDS
+from .hashing import HasherBusy
+from .compression import compress, compress_cached
+from .serialization import dumps, json_response, public_event, raw_documents_to_json, EVENT_JSON_RAW
+from .events import get_user_events, get_events_in_window, summarize_events, SUMMARY_GRANULARITIES, MAX_SUMMARY_DAYS, SUMMARY_TOP, event_projection, recurrence_fields, OVERRIDE_FIELDS, apply_event_batch, clean_event_changes, MAX_BATCH_OPERATIONS
+from .recurrence import occurrence_dates, with_occurrences
+from .event_parser import parse_event, parse_events, MAX_PARSE_LINES
+from .search import with_title_terms, search_events, suggest_events, SEARCH_PAGE_SIZE, SUGGEST_SIZE, MAX_QUERY_LENGTH
+from .conflicts import event_interval, record_event, forget_event, invalidate_user, find_event_conflicts, find_conflicting_pairs, MAX_EVENT_SPAN
+from .calendar_io import parse_ndjson, parse_ics, import_events, export_ndjson, export_ics, EXPORT_BATCH_SIZE
+from .sync import start_sync, get_changes, CursorExpired, MAX_CHANGES_PAGE
+from .cache import event_cache, event_cache_key
+from .notifications import event_stream, publish_event_change
+from .availability import busy_mask, find_common_slots, participant_intervals, MAX_WINDOW_DAYS
 
 main = Blueprint('main', __name__)
 
@@ -16,6 +47,10 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def events_changed(user_id, op, event_ids=()):
+    """Notify the user's open streams; cached reads were already invalidated by the write."""
+    publish_event_change(user_id, op, event_ids)
+
 @main.route('/api/login', methods=['POST'])
 def login():
     data = request.json
@@ -30,7 +65,7 @@ def login():
     
     # If not found by email, try username
     if not user_data:
-        user_data = users_collection.find_one({"username": identifier})
+        user_data = get_user_by_username(identifier)
     
     if not user_data:
         return jsonify({'error': 'Invalid username/email or password'}), 401
@@ -40,8 +75,21 @@ def login():
         return jsonify({'error': 'User account needs to be reset. Please contact support.'}), 401
     
     # Verify password
-    if not verify_password(password, user_data['password_hash']):
-        return jsonify({'error': 'Invalid username/email or password'}), 401
+    try:
+        if not verify_password(password, user_data['password_hash']):
+            return jsonify({'error': 'Invalid username/email or password'}), 401
+    except HasherBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
+    
+    # Upgrade hashes made with an older cost factor while we have the password
+    if password_needs_rehash(user_data['password_hash']):
+        try:
+            users_collection.update_one(
+                {"_id": user_data['_id']},
+                {"$set": {"password_hash": hash_password(password)}}
+            )
+        except Exception as e:
+            print(f"Error rehashing password: {str(e)}")  # Add logging
     
     # Generate token
     token = generate_token(str(user_data['_id']))
@@ -59,6 +107,15 @@ def login():
         'user': user_data
     })
 
+@main.route('/api/logout', methods=['POST'])
+@token_required
+def logout(**kwargs):
+    try:
+        revoke_token(get_request_token())
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
 @main.route('/api/register', methods=['POST'])
 def register():
     data = request.json
@@ -75,11 +132,14 @@ def register():
     if users_collection.find_one({"email": email}):
         return jsonify({'error': 'Email already registered'}), 400
     
-    if users_collection.find_one({"username": username}):
+    if get_user_by_username(username):
         return jsonify({'error': 'Username already taken'}), 400
     
     # Hash password
-    password_hash = hash_password(password)
+    try:
+        password_hash = hash_password(password)
+    except HasherBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
     
     # Create user
     user_data = {
@@ -153,6 +213,7 @@ def upload_profile_image(**kwargs):
         return jsonify({'error': str(e)}), 400
 
 @main.route('/api/profile-image/<filename>')
+@compress(False)
 def get_profile_image(filename):
     return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
 
@@ -162,20 +223,44 @@ def get_profile_image(filename):
 def get_events(**kwargs):
     user_id = kwargs['user_id']
     
+    # Optional window and paging parameters, and the fields to return
+    start = request.args.get('start')
+    end = request.args.get('end')
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit')
+    fields = request.args.get('fields')
+    
+    try:
+        start = datetime.fromisoformat(start) if start else None
+        end = datetime.fromisoformat(end) if end else None
+        limit = int(limit) if limit else None
+    except ValueError:
+        return jsonify({'error': 'start/end must be ISO dates and limit a number'}), 400
+    
     try:
-        # Find events for the user
-        events = list(events_collection.find({"user_id": ObjectId(user_id)}))
+        projection = event_projection(fields, as_strings=EVENT_JSON_RAW)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if limit is not None and limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+    
+    try:
+        # Serve repeated polls from the per-user cache; any write, in any
+        # worker, bumps the user's shared version and so moves reads to a fresh key
+        cache_key = event_cache_key(user_id, start, end, limit, cursor, fields)
         
-        # Convert ObjectId to string for JSON serialization
-        for event in events:
-            event['event_id'] = str(event['_id'])
-            event['user_id'] = str(event['user_id'])
-            # Convert datetime to ISO format string
-            if 'date' in event:
-                event['date'] = event['date'].isoformat()
-            event.pop('_id', None)
+        def build():
+            # Find events for the user inside the requested window
+            # The projection already gives events their API shape, so they
+            # go straight to the encoder (or, raw, straight from BSON to JSON)
+            events, next_cursor = get_user_events(ObjectId(user_id), start, end, limit, cursor,
+                                                  projection, raw=EVENT_JSON_RAW)
+            body = raw_documents_to_json(events) if EVENT_JSON_RAW else dumps(events)
+            return body, {'X-Next-Cursor': next_cursor} if next_cursor else {}
         
-        return jsonify(events)
+        # Answers If-None-Match with an empty 304
+        return _cached_json(cache_key, build)
     except Exception as e:
         print(f"Error in get_events: {str(e)}")  # Add logging
         return jsonify({'error': str(e)}), 400
@@ -199,38 +284,347 @@ def create_event(**kwargs):
             'created_at': datetime.utcnow()
         }
         
-        # Insert event into database
-        result = events_collection.insert_one(event_data)
+        # Optional length of the event, in minutes
+        if data.get('duration'):
+            event_data['duration'] = int(data['duration'])
+        
+        # Optional recurrence rule and skipped dates
+        event_data.update(recurrence_fields(data))
+        
+        # Title word prefixes for autocomplete
+        with_title_terms(event_data)
+        
+        # Reject a malformed time or duration before anything is stored
+        try:
+            event_interval(event_data)
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'time must be HH:MM and duration a number of minutes'}), 400
+        
+        # Insert event into database, stamped with its change sequence for the sync feed
+        with reserved_event_seqs(event_data['user_id']) as seq:
+            event_data['updated_seq'] = seq
+            result = events_collection.insert_one(event_data)
         
         # Get the created event
         event_data = events_collection.find_one({"_id": result.inserted_id})
-        event_data['event_id'] = str(event_data['_id'])
-        event_data['user_id'] = str(event_data['user_id'])
-        event_data['date'] = event_data['date'].isoformat()
-        event_data.pop('_id', None)
         
-        return jsonify({'success': True, 'event': event_data}), 201
+        # Report any existing events this one (or any of its occurrences) overlaps
+        conflicts = find_event_conflicts(event_data)
+        record_event(event_data)
+        events_changed(event_data['user_id'], 'create', [event_data['_id']])
+        
+        public_event(event_data)
+        
+        return jsonify({'success': True, 'event': event_data, 'conflicts': conflicts}), 201
     except Exception as e:
         print(f"Error in create_event: {str(e)}")  # Add logging
         return jsonify({'error': str(e)}), 400
 
+@main.route('/api/events/summary', methods=['GET'])
+@token_required
+def get_event_summary(**kwargs):
+    user_id = kwargs['user_id']
+    granularity = request.args.get('granularity', 'day')
+    
+    try:
+        start = datetime.fromisoformat(request.args['start'])
+        end = datetime.fromisoformat(request.args['end'])
+        top = int(request.args.get('top', SUMMARY_TOP))
+    except (KeyError, ValueError):
+        return jsonify({'error': 'start and end must be ISO dates and top a number'}), 400
+    
+    if granularity not in SUMMARY_GRANULARITIES:
+        return jsonify({'error': 'granularity must be day or week'}), 400
+    if end <= start or end - start > timedelta(days=MAX_SUMMARY_DAYS):
+        return jsonify({'error': f'end must be after start and at most {MAX_SUMMARY_DAYS} days later'}), 400
+    top = min(max(top, 1), 20)
+    
+    try:
+        # Cached and revalidated like the event list
+        cache_key = event_cache_key(user_id, 'summary', start, end, granularity, top)
+        
+        def build():
+            return dumps({'granularity': granularity, 'buckets': summarize_events(user_id, start, end, granularity, top)}), {}
+        
+        return _cached_json(cache_key, build)
+    except Exception as e:
+        print(f"Error in get_event_summary: {str(e)}")  # Add logging
+        return jsonify({'error': str(e)}), 400
+
+def _search_args(default_limit, default_fields=None):
+    """Read q, limit and fields for the search endpoints; returns (args, error response)."""
+    query = (request.args.get('q') or '').strip()
+    if not query or len(query) > MAX_QUERY_LENGTH:
+        return None, (jsonify({'error': f'q is required and at most {MAX_QUERY_LENGTH} characters'}), 400)
+    try:
+        limit = int(request.args.get('limit', default_limit))
+    except ValueError:
+        return None, (jsonify({'error': 'limit must be a number'}), 400)
+    if limit < 1:
+        return None, (jsonify({'error': 'limit must be positive'}), 400)
+    fields = request.args.get('fields', default_fields)
+    try:
+        projection = event_projection(fields)
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+    return (query, limit, fields, projection), None
+
+def _cached_json(cache_key, build):
+    """Serve a JSON body from the per-user cache with an ETag, building it on a miss.
+    
+    Compressed copies of the body are cached alongside it, one per encoding.
+    """
+    cached = event_cache.get(cache_key)
+    if cached is None:
+        body, headers = build()
+        cached = (body, hashlib.sha256(body).hexdigest()[:32], headers, {})
+        event_cache.set(cache_key, cached)
+    
+    body, etag, headers, encoded = cached
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    for name, value in headers.items():
+        response.headers[name] = value
+    compress_cached(response, encoded)
+    return response.make_conditional(request)
+
+@main.route('/api/events/search', methods=['GET'])
+@token_required
+def search_events_route(**kwargs):
+    user_id = kwargs['user_id']
+    cursor = request.args.get('cursor')
+    args, error = _search_args(SEARCH_PAGE_SIZE)
+    if error:
+        return error
+    query, limit, fields, projection = args
+    
+    def build():
+        events, next_cursor = search_events(user_id, query, limit, cursor, projection)
+        return dumps(events), {'X-Next-Cursor': next_cursor} if next_cursor else {}
+    
+    try:
+        return _cached_json(event_cache_key(user_id, 'search', query, limit, cursor, fields), build)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except ExecutionTimeout:
+        return jsonify({'error': 'Search took too long; try more specific words'}), 503
+    except Exception as e:
+        print(f"Error in search_events: {str(e)}")  # Add logging
+        return jsonify({'error': str(e)}), 400
+
+@main.route('/api/events/search/suggest', methods=['GET'])
+@token_required
+def suggest_events_route(**kwargs):
+    user_id = kwargs['user_id']
+    # Suggestions only need enough to show in a dropdown
+    args, error = _search_args(SUGGEST_SIZE, 'summary')
+    if error:
+        return error
+    query, limit, fields, projection = args
+    
+    def build():
+        return dumps(suggest_events(user_id, query, limit, projection)), {}
+    
+    try:
+        # Type-ahead repeats the same prefixes a lot, so these are cached too
+        return _cached_json(event_cache_key(user_id, 'suggest', query.lower(), limit, fields), build)
+    except ExecutionTimeout:
+        return jsonify({'error': 'Search took too long; try more specific words'}), 503
+    except Exception as e:
+        print(f"Error in suggest_events: {str(e)}")  # Add logging
+        return jsonify({'error': str(e)}), 400
+
+@main.route('/api/events/parse', methods=['POST'])
+@token_required
+def parse_events_route(**kwargs):
+    # One line as {"text": ...}, many as {"lines": [...]} or a text/plain body
+    data = request.get_json(silent=True) or {}
+    if request.mimetype == 'text/plain':
+        lines = request.get_data(as_text=True).splitlines()
+    else:
+        lines = data.get('lines')
+    
+    # Relative dates are resolved against the client's own date when it sends one
+    today = data.get('today') or request.args.get('today')
+    try:
+        today = date.fromisoformat(today) if today else None
+    except ValueError:
+        return jsonify({'error': 'today must be an ISO date'}), 400
+    
+    if lines is None:
+        try:
+            return json_response({'event': parse_event(data.get('text'), today)})
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    
+    if not isinstance(lines, list) or len(lines) > MAX_PARSE_LINES:
+        return jsonify({'error': f'lines must be a list of at most {MAX_PARSE_LINES} strings'}), 400
+    return json_response({'results': parse_events([str(line) for line in lines], today)})
+
+@main.route('/api/events/conflicts', methods=['GET'])
+@token_required
+def get_event_conflicts(**kwargs):
+    user_id = ObjectId(kwargs['user_id'])
+    
+    try:
+        start = datetime.fromisoformat(request.args['start'])
+        end = datetime.fromisoformat(request.args['end'])
+    except (KeyError, ValueError):
+        return jsonify({'error': 'start and end must be ISO dates'}), 400
+    
+    try:
+        # Events are keyed by day, so look back far enough to catch ones running into the window
+        events = get_events_in_window(user_id, start - MAX_EVENT_SPAN, end)
+        pairs = find_conflicting_pairs(events, start, end)
+        return jsonify({'conflicts': pairs})
+    except Exception as e:
+        print(f"Error in get_event_conflicts: {str(e)}")  # Add logging
+        return jsonify({'error': str(e)}), 400
+
+@main.route('/api/events/import', methods=['POST'])
+@token_required
+def import_events_route(**kwargs):
+    user_id = ObjectId(kwargs['user_id'])
+    
+    # Format comes from ?format= or the Content-Type
+    import_format = request.args.get('format')
+    if not import_format:
+        import_format = 'ics' if request.mimetype == 'text/calendar' else 'ndjson'
+    if import_format not in ('ndjson', 'ics'):
+        return jsonify({'error': 'format must be ndjson or ics'}), 400
+    
+    try:
+        # Parse the body line by line as it arrives instead of loading it whole
+        parse = parse_ics if import_format == 'ics' else parse_ndjson
+        summary = import_events(user_id, parse(request.stream), insert_events)
+        if summary['imported']:
+            invalidate_user(user_id)
+            events_changed(user_id, 'import')
+        return jsonify(summary), 200 if not summary['failed'] else 207
+    except Exception as e:
+        print(f"Error in import_events: {str(e)}")  # Add logging
+        return jsonify({'error': str(e)}), 400
+
+@main.route('/api/events/export', methods=['GET'])
+@token_required
+def export_events_route(**kwargs):
+    user_id = ObjectId(kwargs['user_id'])
+    
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'ics'):
+        return jsonify({'error': 'format must be ndjson or ics'}), 400
+    
+    try:
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        return jsonify({'error': 'start/end must be ISO dates'}), 400
+    
+    # Stream straight from the cursor so large calendars are never held in memory
+    events = iter_events_by_user(user_id, start, end, EXPORT_BATCH_SIZE)
+    if export_format == 'ics':
+        return Response(stream_with_context(export_ics(events)), mimetype='text/calendar',
+                        headers={'Content-Disposition': 'attachment; filename="events.ics"'})
+    return Response(stream_with_context(export_ndjson(events)), mimetype='application/x-ndjson')
+
+@main.route('/api/events/batch', methods=['POST'])
+@token_required
+def batch_events(**kwargs):
+    user_id = ObjectId(kwargs['user_id'])
+    data = request.json or {}
+    operations = data.get('operations')
+    
+    if not isinstance(operations, list) or not all(isinstance(op, dict) for op in operations):
+        return jsonify({'error': 'operations must be a list of objects'}), 400
+    
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({'error': f'A batch cannot have more than {MAX_BATCH_OPERATIONS} operations'}), 400
+    
+    try:
+        results = apply_event_batch(user_id, operations, ordered=bool(data.get('ordered', True)))
+        invalidate_user(user_id)
+        events_changed(user_id, 'batch', [r['event_id'] for r in results if 'event_id' in r])
+        failed = any(result['status'] >= 400 for result in results)
+        return jsonify({'success': not failed, 'results': results}), 207 if failed else 200
+    except Exception as e:
+        print(f"Error in batch_events: {str(e)}")  # Add logging
+        return jsonify({'error': str(e)}), 400
+
+@main.route('/api/events/changes', methods=['GET'])
+@token_required
+def get_event_changes(**kwargs):
+    user_id = ObjectId(kwargs['user_id'])
+    since = request.args.get('since')
+    
+    # Without a cursor the client has to download everything first; hand out
+    # the cursor before it does so that nothing written meanwhile is missed
+    if not since:
+        return jsonify({'reset': True, 'cursor': start_sync(user_id), 'changes': [], 'has_more': False})
+    
+    try:
+        limit = int(request.args.get('limit', MAX_CHANGES_PAGE))
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+    
+    try:
+        changes, cursor, has_more = get_changes(user_id, since, max(1, limit))
+    except CursorExpired:
+        return jsonify({'error': 'Cursor expired, resync required', 'reset': True,
+                        'cursor': start_sync(user_id)}), 410
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = []
+    for kind, item in changes:
+        if kind == 'delete':
+            response.append({'type': 'delete', 'event_id': str(item)})
+            continue
+        public_event(item)
+        response.append({'type': 'upsert', 'event': item})
+    
+    return jsonify({'changes': response, 'cursor': cursor, 'has_more': has_more})
+
+@main.route('/api/events/stream', methods=['GET'])
+@compress(False)
+def stream_events():
+    # EventSource cannot send headers, so browsers open the stream with a
+    # short-lived ticket in the query string rather than their login token
+    try:
+        user_id, sid, session_exp = stream_session(get_request_token(), request.args.get('ticket'))
+        user_id = ObjectId(user_id)
+    except Exception:
+        return jsonify({'error': 'Invalid token'}), 401
+    
+    # Checked between messages, so a stream ends once its login expires or is revoked
+    def still_valid():
+        return session_active(sid, session_exp)
+    
+    return Response(
+        stream_with_context(event_stream(user_id, still_valid=still_valid)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@main.route('/api/events/stream/ticket', methods=['POST'])
+@token_required
+def create_stream_ticket(**kwargs):
+    return jsonify({'ticket': generate_stream_ticket(get_request_token()), 'expires_in': STREAM_TICKET_SECONDS})
+
 @main.route('/api/events/<event_id>', methods=['GET'])
 @token_required
 def get_event(event_id, **kwargs):
     try:
-        event_data = events_collection.find_one({"_id": ObjectId(event_id)})
+        event_data = get_event_by_id(ObjectId(event_id))
         
         if not event_data:
             return jsonify({'error': 'Event not found'}), 404
             
         # Check if user owns the event
-        if str(event_data['user_id']) != kwargs['user_id']:
+        if event_data['user_id'] != kwargs['user_id']:
             return jsonify({'error': 'Unauthorized'}), 403
         
-        event_data['event_id'] = str(event_data['_id'])
-        event_data['user_id'] = str(event_data['user_id'])
-        event_data['date'] = event_data['date'].isoformat()
-        event_data.pop('_id', None)
+        public_event(event_data)
         
         return jsonify(event_data)
     except Exception as e:
@@ -239,35 +633,32 @@ def get_event(event_id, **kwargs):
 @main.route('/api/events/<event_id>', methods=['PUT'])
 @token_required
 def update_event(event_id, **kwargs):
-    data = request.json
+    data = request.json or {}
     
     try:
-        event_data = events_collection.find_one({"_id": ObjectId(event_id)})
+        event_id = ObjectId(event_id)
+        changes = clean_event_changes(data)
         
-        if not event_data:
-            return jsonify({'error': 'Event not found'}), 404
-            
-        # Check if user owns the event
-        if str(event_data['user_id']) != kwargs['user_id']:
-            return jsonify({'error': 'Unauthorized'}), 403
+        if not changes:
+            return jsonify({'error': 'No changes made'}), 400
         
-        # Update event
-        result = events_collection.update_one(
-            {"_id": ObjectId(event_id)},
-            {"$set": data}
-        )
+        # The owner is part of the filter, so ownership needs no separate read
+        updated_event = update_event_for_owner(event_id, kwargs['user_id'], changes)
         
-        if result.modified_count == 0:
-            return jsonify({'error': 'No changes made'}), 400
+        if not updated_event:
+            # Only on a miss do we look again, to tell "missing" from "not yours"
+            if not event_exists(event_id):
+                return jsonify({'error': 'Event not found'}), 404
+            return jsonify({'error': 'Unauthorized'}), 403
         
-        # Get updated event
-        updated_event = events_collection.find_one({"_id": ObjectId(event_id)})
-        updated_event['event_id'] = str(updated_event['_id'])
-        updated_event['user_id'] = str(updated_event['user_id'])
-        updated_event['date'] = updated_event['date'].isoformat()
-        updated_event.pop('_id', None)
+        # Re-index the event and report what it now overlaps
+        conflicts = find_event_conflicts(updated_event)
+        record_event(updated_event)
+        events_changed(updated_event['user_id'], 'update', [updated_event['_id']])
+        
+        public_event(updated_event)
             
-        return jsonify({'success': True, 'event': updated_event})
+        return jsonify({'success': True, 'event': updated_event, 'conflicts': conflicts})
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
@@ -275,21 +666,140 @@ def update_event(event_id, **kwargs):
 @token_required
 def delete_event(event_id, **kwargs):
     try:
-        event_data = events_collection.find_one({"_id": ObjectId(event_id)})
+        event_id = ObjectId(event_id)
         
-        if not event_data:
-            return jsonify({'error': 'Event not found'}), 404
-            
-        # Check if user owns the event
-        if str(event_data['user_id']) != kwargs['user_id']:
+        # Owner-filtered delete: ownership needs no separate read
+        deleted = delete_event_for_owner(event_id, kwargs['user_id'])
+        
+        if not deleted:
+            if not event_exists(event_id):
+                return jsonify({'error': 'Event not found'}), 404
             return jsonify({'error': 'Unauthorized'}), 403
         
-        # Delete event
-        result = events_collection.delete_one({"_id": ObjectId(event_id)})
+        forget_event(deleted['user_id'], deleted['_id'])
+        events_changed(deleted['user_id'], 'delete', [deleted['_id']])
+        
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+def _series_occurrence(event_id, day, user_id):
+    """Look up a user's series and check `day` is one of its occurrences.
+
+    Returns (series, None) or (None, error response).
+    """
+    series = get_event_by_id(event_id)
+    if not series:
+        return None, (jsonify({'error': 'Event not found'}), 404)
+    if series['user_id'] != user_id:
+        return None, (jsonify({'error': 'Unauthorized'}), 403)
+    if not series.get('recurrence'):
+        return None, (jsonify({'error': 'Event is not recurring'}), 400)
+    if not occurrence_dates(series, day, day):
+        return None, (jsonify({'error': 'No occurrence on that date'}), 404)
+    return series, None
+
+@main.route('/api/events/<event_id>/occurrences/<day>', methods=['PUT'])
+@token_required
+def update_occurrence(event_id, day, **kwargs):
+    data = request.json or {}
+    user_id = kwargs['user_id']
+    
+    try:
+        event_id = ObjectId(event_id)
+        day = datetime.fromisoformat(day)
+    except Exception:
+        return jsonify({'error': 'Invalid event ID or date'}), 400
+    
+    changes = {k: v for k, v in data.items() if k in OVERRIDE_FIELDS}
+    if not changes:
+        return jsonify({'error': f"Only {', '.join(OVERRIDE_FIELDS)} can be changed on one occurrence"}), 400
+    
+    try:
+        series, error = _series_occurrence(event_id, day, user_id)
+        if error:
+            return error
+        
+        # Replaces any earlier override for the same date
+        updated = update_event_for_owner(event_id, user_id, {f"overrides.{day.strftime('%Y-%m-%d')}": changes})
+        if not updated:
+            return jsonify({'error': 'Event not found'}), 404
+        
+        record_event(updated)
+        events_changed(user_id, 'update', [event_id])
+        return jsonify({'success': True, 'event': public_event(updated)})
+    except Exception as e:
+        print(f"Error in update_occurrence: {str(e)}")  # Add logging
+        return jsonify({'error': str(e)}), 400
+
+@main.route('/api/events/<event_id>/occurrences/<day>', methods=['DELETE'])
+@token_required
+def delete_occurrence(event_id, day, **kwargs):
+    user_id = kwargs['user_id']
+    
+    try:
+        event_id = ObjectId(event_id)
+        day = datetime.fromisoformat(day)
+    except Exception:
+        return jsonify({'error': 'Invalid event ID or date'}), 400
+    
+    try:
+        series, error = _series_occurrence(event_id, day, user_id)
+        if error:
+            return error
         
-        if result.deleted_count == 0:
-            return jsonify({'error': 'Failed to delete event'}), 400
+        updated = add_event_exdate(event_id, user_id, day)
+        if not updated:
+            return jsonify({'error': 'Event not found'}), 404
         
+        record_event(updated)
+        events_changed(user_id, 'update', [event_id])
         return jsonify({'success': True})
     except Exception as e:
-        return jsonify({'error': str(e)}), 400 
\ No newline at end of file
+        print(f"Error in delete_occurrence: {str(e)}")  # Add logging
+        return jsonify({'error': str(e)}), 400
+
+# Scheduling routes
+@main.route('/api/schedule/find-slot', methods=['POST'])
+@token_required
+def find_slot(**kwargs):
+    data = request.json or {}
+    
+    try:
+        emails = [email.strip().lower() for email in data['participants']]
+        start = datetime.fromisoformat(data['start'])
+        end = datetime.fromisoformat(data['end'])
+        duration = int(data['duration'])
+        working_hours = tuple(int(hour) for hour in data.get('working_hours', (9, 17)))
+        count = int(data.get('count', 5))
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return jsonify({'error': 'participants, start, end and duration are required'}), 400
+    
+    if end <= start or duration <= 0 or len(working_hours) != 2:
+        return jsonify({'error': 'Invalid window, duration or working hours'}), 400
+    
+    if end - start > timedelta(days=MAX_WINDOW_DAYS):
+        return jsonify({'error': f'Window cannot be longer than {MAX_WINDOW_DAYS} days'}), 400
+    
+    try:
+        # The organizer has to be free too
+        organizer = get_user_by_id(kwargs['user_id'])
+        users_by_id = {user['_id']: user['email'].lower() for user in get_users_by_emails(emails)}
+        if organizer and organizer.get('email'):
+            emails.append(organizer['email'].lower())
+            users_by_id[organizer['_id']] = organizer['email'].lower()
+        emails = list(dict.fromkeys(emails))
+        
+        events = get_events_for_attendees(users_by_id.keys(), emails, start - MAX_EVENT_SPAN, end)
+        events = with_occurrences(events, start - MAX_EVENT_SPAN, end)
+        intervals = participant_intervals(events, emails, users_by_id)
+        
+        masks = [busy_mask(intervals[email], start, end) for email in emails]
+        slots = find_common_slots(masks, start, duration, working_hours, count)
+        
+        return jsonify({
+            'slots': [{'start': s.isoformat(), 'end': e.isoformat()} for s, e in slots]
+        })
+    except Exception as e:
+        print(f"Error in find_slot: {str(e)}")  # Add logging
+        return jsonify({'error': str(e)}), 400
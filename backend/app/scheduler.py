@@ -0,0 +1,271 @@
+import hashlib
+import heapq
+import json
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+# Tasks without a duration are assumed to take an hour
+DEFAULT_TASK_MINUTES = 60
+
+# Default working day, as (start hour, end hour)
+DEFAULT_WORKING_HOURS = (9, 17)
+
+# Never plan further ahead than this
+MAX_HORIZON_DAYS = 90
+
+# Start times are aligned to this many minutes
+SLOT_MINUTES = 15
+
+# Local search limits used when the greedy pass leaves tasks unplaced
+DEFAULT_TIME_BUDGET_MS = 50
+MAX_TIME_BUDGET_MS = 500
+MAX_SEARCH_ITERATIONS = 500
+
+# Number of recent schedules kept in the memo cache
+CACHE_SIZE = 128
+
+PRIORITY_NAMES = {'high': 1, 'medium': 3, 'low': 5}
+
+def _priority(task):
+    """Normalize a task priority to an int where 1 is the most urgent."""
+    priority = task.get('priority', 3)
+    if isinstance(priority, str):
+        priority = PRIORITY_NAMES.get(priority.lower(), priority)
+    try:
+        return int(priority)
+    except (TypeError, ValueError):
+        return 3
+
+def _weight(priority):
+    # One task of a given priority outweighs any number of lower priority ones
+    # in practice (each level is worth 1000x the next)
+    return 1000 ** max(0, 6 - priority)
+
+def _to_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+def _align(minutes):
+    """Round a minute offset from the (aligned) horizon start up to the slot grid."""
+    return -(-minutes // SLOT_MINUTES) * SLOT_MINUTES
+
+def _round_up(moment):
+    """Round a datetime up to the next slot boundary."""
+    moment = moment.replace(second=0, microsecond=0)
+    extra = moment.minute % SLOT_MINUTES
+    if extra:
+        moment += timedelta(minutes=SLOT_MINUTES - extra)
+    return moment
+
+def _deadline(task, horizon_end):
+    """Latest moment a task may finish. Date-only due dates mean end of that day."""
+    due = task.get('due_date')
+    if not due:
+        return horizon_end
+    if isinstance(due, str) and len(due) == 10:
+        return min(datetime.fromisoformat(due) + timedelta(days=1), horizon_end)
+    return min(_to_datetime(due), horizon_end)
+
+def free_gaps(start, end, busy, working_hours=DEFAULT_WORKING_HOURS):
+    """Return the free (start, end) gaps inside working hours between start and end.
+
+    `busy` is an iterable of (start, end) datetimes; it does not need to be sorted
+    or disjoint.
+    """
+    open_hour, close_hour = working_hours
+    blocked = sorted((_to_datetime(b_start), _to_datetime(b_end)) for b_start, b_end in busy)
+
+    gaps = []
+    day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    index = 0
+    while day < end:
+        window_start = max(day + timedelta(hours=open_hour), start)
+        window_end = min(day + timedelta(hours=close_hour), end)
+        day += timedelta(days=1)
+        if window_start >= window_end:
+            continue
+
+        # Skip busy intervals that finished before this working window
+        while index < len(blocked) and blocked[index][1] <= window_start:
+            index += 1
+
+        cursor = window_start
+        scan = index
+        while scan < len(blocked) and blocked[scan][0] < window_end:
+            b_start, b_end = blocked[scan]
+            if b_start > cursor:
+                gaps.append((cursor, b_start))
+            cursor = max(cursor, b_end)
+            scan += 1
+        if cursor < window_end:
+            gaps.append((cursor, window_end))
+    return gaps
+
+class _GapTree:
+    """Max segment tree over gap lengths, for O(log n) earliest-fit lookups."""
+
+    def __init__(self, lengths):
+        size = 1
+        while size < max(1, len(lengths)):
+            size *= 2
+        self.size = size
+        self.tree = [0] * (2 * size)
+        self.tree[size:size + len(lengths)] = lengths
+        for i in range(size - 1, 0, -1):
+            self.tree[i] = max(self.tree[2 * i], self.tree[2 * i + 1])
+
+    def first_fit(self, length):
+        """Index of the earliest gap at least `length` long, or None."""
+        if self.tree[1] < length:
+            return None
+        i = 1
+        while i < self.size:
+            i = 2 * i if self.tree[2 * i] >= length else 2 * i + 1
+        return i - self.size
+
+    def set(self, index, length):
+        i = index + self.size
+        self.tree[i] = length
+        i //= 2
+        while i:
+            self.tree[i] = max(self.tree[2 * i], self.tree[2 * i + 1])
+            i //= 2
+
+def _place(order, jobs, gaps):
+    """Place jobs earliest-fit in the given order.
+
+    `jobs` are (duration, deadline, weight) tuples and `gaps` (start, end) pairs, all in
+    minutes from the horizon start, with gap starts on the slot grid. Returns ({job index: start}, score).
+    """
+    starts = [gap[0] for gap in gaps]
+    ends = [gap[1] for gap in gaps]
+    tree = _GapTree([e - s for s, e in gaps])
+
+    placed = {}
+    score = 0
+    for job in order:
+        duration, deadline, weight = jobs[job]
+        gap = tree.first_fit(duration)
+        # Gaps are ordered by time, so if the earliest one that is long enough
+        # ends too late, no other gap can work either
+        if gap is None or starts[gap] + duration > deadline:
+            continue
+        placed[job] = starts[gap]
+        score += weight
+        # Keep the next start aligned to the slot grid
+        starts[gap] += _align(duration)
+        tree.set(gap, max(0, ends[gap] - starts[gap]))
+    return placed, score
+
+def _local_search(order, jobs, gaps, placed, score, budget_seconds, rng):
+    """Try to fit more (or heavier) tasks by promoting unplaced ones in the order."""
+    deadline = time.perf_counter() + budget_seconds
+    best_order, best_placed, best_score = order, placed, score
+
+    for _ in range(MAX_SEARCH_ITERATIONS):
+        if time.perf_counter() >= deadline:
+            break
+        missing = [job for job in best_order if job not in best_placed]
+        if not missing:
+            break
+
+        # Move a random unplaced task to an earlier position in the order
+        candidate = list(best_order)
+        job = rng.choice(missing)
+        position = candidate.index(job)
+        candidate.pop(position)
+        candidate.insert(rng.randrange(0, position + 1), job)
+
+        new_placed, new_score = _place(candidate, jobs, gaps)
+        if new_score > best_score:
+            best_order, best_placed, best_score = candidate, new_placed, new_score
+    return best_placed, best_score
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _cache_key(tasks, busy, start, working_hours):
+    payload = json.dumps([tasks, busy, start, working_hours], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def schedule_tasks(tasks, busy=(), start=None, working_hours=DEFAULT_WORKING_HOURS,
+                   time_budget_ms=DEFAULT_TIME_BUDGET_MS, use_cache=True):
+    """Place tasks into the free time around `busy` intervals before their due dates.
+
+    Tasks are taken highest priority first (earlier due date, then shorter
+    duration, breaking ties) and each goes into the earliest free gap that fits.
+    If some tasks cannot be placed, a bounded local search looks for an order
+    that fits more of them, for at most MAX_TIME_BUDGET_MS. Results are memoized
+    on a hash of the inputs.
+
+    Returns {'scheduled': [...], 'unscheduled': [...]}, where scheduled entries
+    are the task dicts plus `scheduled_start`/`scheduled_end`.
+    """
+    start = _round_up(_to_datetime(start) if start else datetime.now())
+    busy = [(_to_datetime(b_start), _to_datetime(b_end)) for b_start, b_end in busy]
+    working_hours = tuple(working_hours)
+    time_budget_ms = min(time_budget_ms, MAX_TIME_BUDGET_MS)
+
+    key = None
+    if use_cache:
+        key = _cache_key(tasks, busy, start, working_hours)
+        with _cache_lock:
+            if key in _cache:
+                _cache.move_to_end(key)
+                return _cache[key]
+
+    horizon_end = start + timedelta(days=MAX_HORIZON_DAYS)
+    latest = start
+    for task in tasks:
+        latest = max(latest, _deadline(task, horizon_end))
+    # A gap that opens when a busy interval ends (say at 10:07) starts at the
+    # next slot boundary (10:15); start is aligned, so offsets align the same way
+    gaps = []
+    for g_start, g_end in free_gaps(start, latest, busy, working_hours):
+        g_start = _align(int(-(-(g_start - start).total_seconds() // 60)))
+        g_end = int((g_end - start).total_seconds() // 60)
+        if g_start < g_end:
+            gaps.append((g_start, g_end))
+
+    jobs = []
+    heap = []
+    for index, task in enumerate(tasks):
+        duration = int(task.get('duration') or DEFAULT_TASK_MINUTES)
+        due = int((_deadline(task, horizon_end) - start).total_seconds() // 60)
+        priority = _priority(task)
+        jobs.append((duration, due, _weight(priority)))
+        heapq.heappush(heap, (priority, due, duration, index))
+    order = [heapq.heappop(heap)[3] for _ in range(len(heap))]
+
+    placed, score = _place(order, jobs, gaps)
+    if len(placed) < len(jobs) and time_budget_ms > 0:
+        # Seed from the inputs so identical requests get identical answers
+        rng = random.Random(key or len(jobs))
+        placed, score = _local_search(order, jobs, gaps, placed, score,
+                                      time_budget_ms / 1000.0, rng)
+
+    scheduled = []
+    unscheduled = []
+    for index in order:
+        task = tasks[index]
+        if index in placed:
+            task_start = start + timedelta(minutes=placed[index])
+            entry = dict(task)
+            entry['scheduled_start'] = task_start.isoformat()
+            entry['scheduled_end'] = (task_start + timedelta(minutes=jobs[index][0])).isoformat()
+            scheduled.append(entry)
+        else:
+            unscheduled.append(dict(task))
+    scheduled.sort(key=lambda entry: entry['scheduled_start'])
+
+    result = {'scheduled': scheduled, 'unscheduled': unscheduled}
+    if use_cache:
+        with _cache_lock:
+            _cache[key] = result
+            if len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    return result
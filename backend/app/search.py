@@ -0,0 +1,111 @@
+import argparse
+import base64
+import json
+import os
+import re
+import unicodedata
+from bson import ObjectId
+from .database import search_events_by_user, suggest_events_by_user, iter_events_missing_terms, set_title_terms
+
+# Title words are indexed by their leading characters ("edge n-grams") in
+# `title_terms`, so type-ahead is an equality match on a multikey index rather
+# than a regex over every title
+MAX_PREFIX = 15
+MAX_TITLE_WORDS = 20
+
+# Longest query accepted and most words looked at
+MAX_QUERY_LENGTH = 200
+MAX_QUERY_WORDS = 8
+
+# Page sizes for ranked search and for suggestions
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 50
+SUGGEST_SIZE = 8
+MAX_SUGGEST_SIZE = 20
+
+# The server gives up on a search after this long rather than holding the request
+SEARCH_TIMEOUT_MS = int(os.getenv('SEARCH_TIMEOUT_MS', '2000'))
+
+BACKFILL_BATCH_SIZE = 500
+
+_WORD = re.compile(r'\w+')
+
+def _words(text):
+    # Lower case without accents, so "Café" is found by "cafe"
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _WORD.findall(text.lower())
+
+def title_terms(title):
+    """Edge n-grams of every word in a title: "Team lunch" -> t, te, tea, team, l, lu, ..."""
+    terms = set()
+    for word in _words(title)[:MAX_TITLE_WORDS]:
+        for size in range(1, min(len(word), MAX_PREFIX) + 1):
+            terms.add(word[:size])
+    return sorted(terms)
+
+def with_title_terms(fields):
+    """Add `title_terms` to a document or $set that writes a title."""
+    if 'title' in fields:
+        fields['title_terms'] = title_terms(fields['title'])
+    return fields
+
+def encode_search_cursor(event):
+    """Paging cursor from the last result of a page: its score and id."""
+    raw = json.dumps([event['score'], str(event.get('event_id', event.get('_id')))])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_search_cursor(cursor):
+    """Turn a search cursor back into a (score, _id) pair. Raises ValueError if malformed."""
+    try:
+        score, event_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return float(score), ObjectId(event_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def search_events(user_id, query, limit=SEARCH_PAGE_SIZE, cursor=None, projection=None):
+    """Ranked keyword search over a user's event titles and descriptions.
+
+    Returns (events, next_cursor); each event carries its relevance `score`.
+    """
+    after = decode_search_cursor(cursor) if cursor else None
+    limit = min(limit, MAX_SEARCH_PAGE_SIZE)
+    # Fetch one extra result to know whether another page exists
+    events = search_events_by_user(user_id, query, limit + 1, after, projection, SEARCH_TIMEOUT_MS)
+    if len(events) > limit:
+        events = events[:limit]
+        return events, encode_search_cursor(events[-1])
+    return events, None
+
+def suggest_events(user_id, query, limit=SUGGEST_SIZE, projection=None):
+    """Events whose title has a word starting with each word of `query`, latest first."""
+    prefixes = list(dict.fromkeys(word[:MAX_PREFIX] for word in _words(query)))[:MAX_QUERY_WORDS]
+    if not prefixes:
+        return []
+    return suggest_events_by_user(user_id, prefixes, min(limit, MAX_SUGGEST_SIZE), projection, SEARCH_TIMEOUT_MS)
+
+def backfill_title_terms():
+    """Add `title_terms` to events stored before autocomplete existed. Returns the number updated."""
+    updated = 0
+    batch = []
+    for event in iter_events_missing_terms():
+        batch.append((event['_id'], title_terms(event.get('title'))))
+        if len(batch) == BACKFILL_BATCH_SIZE:
+            updated += set_title_terms(batch)
+            batch = []
+    if batch:
+        updated += set_title_terms(batch)
+    return updated
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Maintain the fields event search relies on.')
+    parser.add_argument('--backfill', action='store_true', help='index the titles of events that predate autocomplete')
+    args = parser.parse_args(argv)
+    if not args.backfill:
+        parser.print_help()
+        return 1
+    print(f"Indexed {backfill_title_terms()} event titles")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,95 @@
+import json
+import os
+from datetime import date, datetime
+from bson import ObjectId
+from flask import current_app
+from flask.json import JSONEncoder
+
+# orjson is optional: it encodes datetimes natively and is several times faster
+# than the standard library on large lists
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# python-bsonjs is optional: it turns raw BSON into JSON in C. List reads use it
+# when EVENT_JSON_RAW=1, so documents are never decoded into Python objects.
+try:
+    import bsonjs
+except ImportError:
+    bsonjs = None
+
+EVENT_JSON_RAW = os.getenv('EVENT_JSON_RAW') == '1' and bsonjs is not None
+
+class MongoJSONEncoder(JSONEncoder):
+    """Flask JSON encoder that writes ObjectIds as strings and dates as ISO 8601."""
+
+    def default(self, o):
+        if isinstance(o, ObjectId):
+            return str(o)
+        if isinstance(o, (datetime, date)):
+            return o.isoformat()
+        return super().default(o)
+
+def _orjson_default(o):
+    if isinstance(o, ObjectId):
+        return str(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def dumps(data):
+    """Encode to JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_orjson_default)
+    return json.dumps(data, cls=MongoJSONEncoder, separators=(',', ':')).encode('utf-8')
+
+def json_response(data, status=200):
+    """Like jsonify, but through the fast encoder."""
+    return current_app.response_class(dumps(data), status=status, mimetype='application/json')
+
+def public_event(event):
+    """Rename _id to event_id for the API and drop internal search terms; other fields are encoded as they are."""
+    event['event_id'] = event.pop('_id')
+    event.pop('title_terms', None)
+    return event
+
+def _iso_date(field):
+    # Same text as datetime.isoformat() and orjson: fractional seconds only when
+    # present, and then as six digits. BSON dates stop at milliseconds, so the
+    # last three are always zero.
+    value = f'${field}'
+    return {'$cond': [
+        {'$eq': [{'$type': value}, 'date']},
+        {'$cond': [
+            {'$eq': [{'$millisecond': value}, 0]},
+            {'$dateToString': {'date': value, 'format': '%Y-%m-%dT%H:%M:%S'}},
+            {'$dateToString': {'date': value, 'format': '%Y-%m-%dT%H:%M:%S.%L000'}}
+        ]},
+        value
+    ]}
+
+def event_json_projection(fields, as_strings=False):
+    """Projection that returns events in their API shape, `_id` already renamed to `event_id`.
+
+    With as_strings the server also converts ObjectIds and dates to strings, so
+    the documents can be transcoded to JSON without any Python work.
+    """
+    projection = {'_id': 0}
+    for field in fields:
+        if as_strings and field == 'user_id':
+            projection[field] = {'$toString': '$user_id'}
+        elif as_strings and field in ('date', 'end', 'created_at'):
+            projection[field] = _iso_date(field)
+        else:
+            projection[field] = 1
+    projection['event_id'] = {'$toString': '$_id'} if as_strings else '$_id'
+    return projection
+
+def raw_documents_to_json(documents):
+    """Join RawBSONDocuments into a JSON array without decoding them.
+
+    Plain dicts (e.g. expanded occurrences of a recurring event) go through dumps().
+    """
+    return ('[' + ','.join(
+        bsonjs.dumps(document.raw, mode=bsonjs.RELAXED) if hasattr(document, 'raw') else dumps(document).decode('utf-8')
+        for document in documents
+    ) + ']').encode('utf-8')
@@ -0,0 +1,65 @@
+import base64
+import json
+import time
+from .database import (
+    settled_event_seq,
+    get_events_changed_since,
+    get_tombstones_since,
+    TOMBSTONE_RETENTION_DAYS
+)
+
+# Upper bound on changes returned by one feed request
+MAX_CHANGES_PAGE = 500
+
+# A cursor older than this may point past compacted tombstones
+CURSOR_MAX_AGE_SECONDS = TOMBSTONE_RETENTION_DAYS * 24 * 60 * 60
+
+class CursorExpired(Exception):
+    """The client must do a full resync before using the change feed again."""
+
+def encode_sync_cursor(seq):
+    """Build an opaque change feed cursor for a sequence number."""
+    raw = json.dumps([seq, int(time.time())])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_sync_cursor(cursor):
+    """Return the sequence number in a cursor. Raises ValueError or CursorExpired."""
+    try:
+        seq, issued_at = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        seq, issued_at = int(seq), int(issued_at)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if time.time() - issued_at > CURSOR_MAX_AGE_SECONDS:
+        raise CursorExpired()
+    return seq
+
+def start_sync(user_id):
+    """Cursor for a client that is about to download the full event list."""
+    return encode_sync_cursor(settled_event_seq(user_id))
+
+def get_changes(user_id, cursor, limit=MAX_CHANGES_PAGE):
+    """Return (changes, next_cursor, has_more) for everything written after `cursor`.
+
+    Each change is ('upsert', event) or ('delete', event_id), in write order.
+    Only changes up to the settled watermark are returned, so a write that took
+    an earlier sequence number but has not landed yet is never skipped.
+    """
+    since = decode_sync_cursor(cursor)
+    limit = min(limit, MAX_CHANGES_PAGE)
+    settled = max(settled_event_seq(user_id), since)
+
+    # Both lists are already ordered by sequence; merge them
+    events = get_events_changed_since(user_id, since, settled, limit + 1)
+    tombstones = get_tombstones_since(user_id, since, settled, limit + 1)
+    merged = sorted(
+        [(event['updated_seq'], 'upsert', event) for event in events] +
+        [(tombstone['updated_seq'], 'delete', tombstone['event_id']) for tombstone in tombstones],
+        key=lambda change: change[0]
+    )
+
+    has_more = len(merged) > limit
+    page = merged[:limit]
+    # A full page stops at its last change; otherwise the cursor moves up to the
+    # watermark, over numbers whose write failed and will never appear
+    last_seq = page[-1][0] if has_more else settled
+    return [(kind, item) for _, kind, item in page], encode_sync_cursor(last_seq), has_more
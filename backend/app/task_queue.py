@@ -0,0 +1,146 @@
+import heapq
+import itertools
+import os
+import threading
+from datetime import datetime, timedelta
+from .scheduler import PRIORITY_NAMES
+
+# "What should I do next" ranking. A task's score is
+#
+#   TASK_PRIORITY_WEIGHT * (6 - priority)        priority 1 is the most urgent
+# + TASK_URGENCY_WEIGHT  * days past its due date (negative until it is due)
+# + TASK_AGE_WEIGHT      * days since it was created
+#
+# Tasks without a due date count as due TASK_UNDATED_DUE_DAYS after creation.
+# Both time terms grow by one per day for every task alike, so the order of
+# tasks never changes as time passes: a heap keyed on the time-independent part
+# stays valid, and only a write to a task moves it.
+TASK_PRIORITY_WEIGHT = float(os.getenv('TASK_PRIORITY_WEIGHT', '10'))
+TASK_URGENCY_WEIGHT = float(os.getenv('TASK_URGENCY_WEIGHT', '2'))
+TASK_AGE_WEIGHT = float(os.getenv('TASK_AGE_WEIGHT', '0.5'))
+TASK_UNDATED_DUE_DAYS = float(os.getenv('TASK_UNDATED_DUE_DAYS', '7'))
+
+# Stored next to each task's `rank` so ranks written under other weights can be found
+RANK_WEIGHTS = [TASK_PRIORITY_WEIGHT, TASK_URGENCY_WEIGHT, TASK_AGE_WEIGHT, TASK_UNDATED_DUE_DAYS]
+
+# Tasks in these states are done with and never ranked
+CLOSED_STATUSES = ('completed', 'cancelled')
+
+# Most tasks one /api/tasks/next call returns
+MAX_NEXT_TASKS = 100
+
+_EPOCH = datetime(2000, 1, 1)
+
+def _days(moment):
+    return (moment - _EPOCH).total_seconds() / 86400
+
+def _parse(value):
+    """A stored timestamp as a naive local datetime, or None if missing or unreadable.
+
+    Naive is the frame created_at and datetime.now() use; a timestamp with an
+    offset (such as "...Z") is converted into it so the two can be compared.
+    """
+    if not isinstance(value, datetime):
+        try:
+            # fromisoformat only accepts a "Z" suffix from Python 3.11
+            value = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+        except (AttributeError, TypeError, ValueError):
+            return None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+def _priority(task):
+    priority = task.get('priority', 3)
+    if isinstance(priority, str):
+        priority = PRIORITY_NAMES.get(priority.lower(), priority)
+    try:
+        return int(priority)
+    except (TypeError, ValueError):
+        return 3
+
+def is_open(task):
+    return task.get('status') not in CLOSED_STATUSES
+
+def base_score(task):
+    """The part of a task's score that does not depend on the current time."""
+    created = _parse(task.get('created_at')) or datetime.now()
+    due = _parse(task.get('due_date'))
+    if due is None:
+        due = created + timedelta(days=TASK_UNDATED_DUE_DAYS)
+    elif isinstance(task.get('due_date'), str) and len(task['due_date']) == 10:
+        # A date-only due date means the end of that day
+        due += timedelta(days=1)
+    return (TASK_PRIORITY_WEIGHT * (6 - _priority(task))
+            - TASK_URGENCY_WEIGHT * _days(due)
+            - TASK_AGE_WEIGHT * _days(created))
+
+def rank_fields(task):
+    """The stored ranking fields of a task: its base score, or None once it is closed."""
+    return {'rank': base_score(task) if is_open(task) else None, 'rank_weights': RANK_WEIGHTS}
+
+def current_score(base, now=None):
+    """A base score as of `now`."""
+    return base + (TASK_URGENCY_WEIGHT + TASK_AGE_WEIGHT) * _days(now or datetime.now())
+
+def task_score(task, now=None):
+    return current_score(base_score(task), now)
+
+class TaskQueue:
+    """One user's open tasks in a max-heap on base score.
+
+    Changed and removed tasks are invalidated lazily: their old heap entry is
+    marked dead and skipped when it surfaces, and the heap is rebuilt once dead
+    entries outnumber live ones.
+    """
+
+    def __init__(self, tasks=()):
+        self._heap = []
+        self._entries = {}
+        self._dead = 0
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        for task in tasks:
+            self.push(task)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def push(self, task):
+        """Insert or re-rank a task; closed tasks are dropped. O(log n)."""
+        with self._lock:
+            self._discard(task['id'])
+            if is_open(task):
+                # [-base, tie-breaker, task]; the counter keeps tasks themselves from being compared
+                entry = [-base_score(task), next(self._counter), task]
+                self._entries[task['id']] = entry
+                heapq.heappush(self._heap, entry)
+
+    def remove(self, task_id):
+        with self._lock:
+            self._discard(task_id)
+
+    def _discard(self, task_id):
+        entry = self._entries.pop(task_id, None)
+        if entry is None:
+            return
+        entry[2] = None
+        self._dead += 1
+        if self._dead > len(self._entries) + 64:
+            self._heap = [entry for entry in self._heap if entry[2] is not None]
+            heapq.heapify(self._heap)
+            self._dead = 0
+
+    def top(self, k, now=None):
+        """The k best open tasks as (score, task), best first. O(k log n)."""
+        with self._lock:
+            best = []
+            while self._heap and len(best) < k:
+                entry = heapq.heappop(self._heap)
+                if entry[2] is None:
+                    self._dead -= 1
+                    continue
+                best.append(entry)
+            for entry in best:
+                heapq.heappush(self._heap, entry)
+        return [(current_score(-entry[0], now), entry[2]) for entry in best]
@@ -0,0 +1,254 @@
+import argparse
+import os
+import threading
+import uuid
+from datetime import datetime
+from .database import (
+    create_task,
+    get_task_by_id,
+    get_tasks_by_ids,
+    get_tasks,
+    get_ranked_tasks,
+    iter_tasks_to_rank,
+    set_task_ranks,
+    get_all_tasks,
+    update_task,
+    delete_task
+)
+from .task_queue import TaskQueue, rank_fields, task_score, MAX_NEXT_TASKS, RANK_WEIGHTS
+
+# Set TASK_INDEX=1 to answer task reads from an in-process index. Only use it
+# when a single process serves the API, since writes made by other worker
+# processes are not seen.
+USE_TASK_INDEX = os.getenv('TASK_INDEX', '0') == '1'
+
+# Tasks written per bulk write when backfilling ranks
+BACKFILL_BATCH_SIZE = 500
+
+def _due_key(task):
+    return (task.get('due_date') is None, task.get('due_date') or '')
+
+class TaskIndex:
+    """In-process index of tasks by id, user, (user, status) and (user, priority)."""
+
+    def __init__(self):
+        self._by_id = {}
+        self._by_user = {}
+        self._by_status = {}
+        self._by_priority = {}
+        self._lock = threading.RLock()
+        self.loaded = False
+
+    def load(self, tasks):
+        with self._lock:
+            for task in tasks:
+                self.add(task)
+            self.loaded = True
+
+    def add(self, task):
+        """Insert or replace a task."""
+        with self._lock:
+            self.remove(task['id'])
+            self._by_id[task['id']] = task
+            user_id = task.get('user_id')
+            # Dicts are used as insertion-ordered sets of task IDs
+            self._by_user.setdefault(user_id, {})[task['id']] = None
+            self._by_status.setdefault((user_id, task.get('status')), {})[task['id']] = None
+            self._by_priority.setdefault((user_id, task.get('priority')), {})[task['id']] = None
+
+    def remove(self, task_id):
+        with self._lock:
+            task = self._by_id.pop(task_id, None)
+            if task is None:
+                return False
+            user_id = task.get('user_id')
+            self._by_user.get(user_id, {}).pop(task_id, None)
+            self._by_status.get((user_id, task.get('status')), {}).pop(task_id, None)
+            self._by_priority.get((user_id, task.get('priority')), {}).pop(task_id, None)
+            return True
+
+    def get(self, task_id):
+        return self._by_id.get(task_id)
+
+    def filter(self, user_id, status=None, priority=None):
+        """Return a user's tasks matching the given status and/or priority."""
+        with self._lock:
+            buckets = []
+            if status is not None:
+                buckets.append(self._by_status.get((user_id, status), {}))
+            if priority is not None:
+                buckets.append(self._by_priority.get((user_id, priority), {}))
+            if not buckets:
+                return [self._by_id[task_id] for task_id in self._by_user.get(user_id, {})]
+
+            # Walk the smallest bucket and check membership in the others
+            buckets.sort(key=len)
+            ids = [task_id for task_id in buckets[0] if all(task_id in b for b in buckets[1:])]
+            tasks = [self._by_id[task_id] for task_id in ids]
+        if priority is not None:
+            tasks.sort(key=_due_key)
+        return tasks
+
+_index = TaskIndex() if USE_TASK_INDEX else None
+
+# Per-user ranking queues, kept alongside the index and under the same
+# single-process condition. A user's queue is built on their first
+# /api/tasks/next call and then updated by every task write. Builds and
+# updates both hold _queues_lock, so a write that lands while a queue is being
+# built waits for it and is applied on top rather than lost.
+_queues = {} if USE_TASK_INDEX else None
+_queues_lock = threading.Lock()
+
+def _get_queue(user_id):
+    """Return the user's ranking queue, building it on first use; None when queues are disabled."""
+    if _queues is None:
+        return None
+    queue = _queues.get(user_id)
+    if queue is None:
+        with _queues_lock:
+            queue = _queues.get(user_id)
+            if queue is None:
+                queue = _queues[user_id] = TaskQueue(get_user_tasks(user_id))
+    return queue
+
+def _update_queue(user_id, task=None, removed_id=None):
+    """Apply a stored write to the user's queue, if one has been built."""
+    if _queues is None:
+        return
+    with _queues_lock:
+        queue = _queues.get(user_id)
+        if queue is None:
+            return
+        if task is not None:
+            queue.push(task)
+        else:
+            queue.remove(removed_id)
+
+def _get_index():
+    """Return the warmed in-process index, or None when it is disabled."""
+    if _index is not None and not _index.loaded:
+        _index.load(get_all_tasks())
+    return _index
+
+def create_new_task(user_id, data):
+    """Create a new task for a user (None for anonymous tasks)."""
+    task = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "task_name": data['task_name'],
+        "description": data.get('description', ''),
+        "due_date": data.get('due_date'),
+        "priority": data.get('priority', 3),  # Default medium priority
+        "status": data.get('status', 'pending'),
+        "tags": data.get('tags', []),
+        "created_at": datetime.now().isoformat()
+    }
+    create_task({**task, **rank_fields(task)})
+    index = _get_index()
+    if index:
+        index.add(task)
+    _update_queue(user_id, task)
+    return task
+
+def get_single_task(task_id):
+    """Get a single task by ID."""
+    index = _get_index()
+    if index:
+        return index.get(task_id)
+    return get_task_by_id(task_id)
+
+def get_tasks_by_id_list(task_ids, user_id):
+    """Get the user's tasks with the given IDs, in the order the IDs were given.
+
+    IDs of tasks that don't exist or belong to someone else are left out.
+    """
+    index = _get_index()
+    if index:
+        found = {task_id: index.get(task_id) for task_id in task_ids}
+    else:
+        found = {task['id']: task for task in get_tasks_by_ids(task_ids, user_id)}
+    return [found[task_id] for task_id in task_ids
+            if found.get(task_id) and found[task_id].get('user_id') == user_id]
+
+def get_user_tasks(user_id, status=None, priority=None):
+    """Get a user's tasks, optionally filtered by status and priority."""
+    index = _get_index()
+    if index:
+        return index.filter(user_id, status, priority)
+    return get_tasks(user_id, status, priority)
+
+def modify_task(task_id, updates):
+    """Update an existing task. Returns the updated task, or None if it does not exist."""
+    task = get_single_task(task_id)
+    if not task:
+        return None
+
+    # Don't allow changing id, owner, creation timestamp or the stored rank
+    updates = {k: v for k, v in updates.items() if k not in ('id', 'user_id', 'created_at', 'rank', 'rank_weights')}
+
+    # Add completion timestamp if task is marked as completed
+    if updates.get('status') == 'completed' and task.get('status') != 'completed':
+        updates['completed_at'] = datetime.now().isoformat()
+
+    if not updates:
+        return task
+
+    ranked = rank_fields({**task, **updates})
+    updated = update_task(task_id, {**updates, **ranked})
+    # Another write to the task may have landed between the read and this one
+    if updated and rank_fields(updated) != ranked:
+        set_task_ranks([(task_id, rank_fields(updated))])
+    index = _get_index()
+    if index and updated:
+        index.add(updated)
+    # Re-ranks the task, or drops it once completed
+    if updated:
+        _update_queue(task.get('user_id'), updated)
+    return updated
+
+def remove_task(task_id):
+    """Delete a task."""
+    # The owner is only needed to find the queue to update
+    task = get_single_task(task_id) if _queues is not None else None
+    deleted = delete_task(task_id)
+    index = _get_index()
+    if index:
+        index.remove(task_id)
+    if task:
+        _update_queue(task.get('user_id'), removed_id=task_id)
+    return deleted
+
+def get_next_tasks(user_id, k):
+    """A user's k highest-scoring open tasks as (score, task), best first."""
+    k = min(k, MAX_NEXT_TASKS)
+    queue = _get_queue(user_id)
+    if queue is not None:
+        return queue.top(k)
+    # Otherwise read the first k of the stored ranks, which every worker keeps current
+    return [(task_score(task), task) for task in get_ranked_tasks(user_id, k)]
+
+def backfill_task_ranks():
+    """Rank tasks stored before ranks existed or under other weights. Returns the number updated."""
+    updated = 0
+    batch = []
+    for task in iter_tasks_to_rank(RANK_WEIGHTS):
+        batch.append((task['id'], rank_fields(task)))
+        if len(batch) == BACKFILL_BATCH_SIZE:
+            updated += set_task_ranks(batch)
+            batch = []
+    if batch:
+        updated += set_task_ranks(batch)
+    return updated
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Maintain the fields task ranking relies on.')
+    parser.add_argument('--backfill', action='store_true', help='rank tasks that predate ranking or whose weights changed')
+    args = parser.parse_args(argv)
+    if not args.backfill:
+        parser.print_help()
+        return 1
+    print(f"Ranked {backfill_task_ranks()} tasks")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
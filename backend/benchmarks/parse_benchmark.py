@@ -0,0 +1,55 @@
+import sys
+import os
+import random
+import time
+from datetime import date
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the app package sets up the database module; no connection is made
+os.environ.setdefault('MONGO_URI', 'mongodb://localhost:27017')
+
+from app.event_parser import parse_event, parse_events
+
+TITLES = ['lunch with Bob', 'Dentist', 'team sync', 'Call mom', 'Review Q3 plan', 'gym', 'Pay rent', 'Flight to Berlin']
+WHENS = ['tomorrow', 'today', 'tonight', 'next fri', 'on monday', 'in 2 weeks', 'on 11/2', 'Dec 5th', '2026-03-01', '',
+         'every weekday', 'every mon and wed']
+TIMES = ['1pm', 'at 9:30', '2-3pm', 'at noon', 'at 7', '10am to 11:30am', '']
+EXTRAS = ['for 45m', 'for 1h30m', '#work', '#personal', '!high', '!low', '!!', '']
+
+def make_lines(count, seed=42):
+    """Random quick-add lines mixing every kind of phrase the parser knows."""
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        parts = [rng.choice(TITLES), rng.choice(WHENS), rng.choice(TIMES), rng.choice(EXTRAS), rng.choice(EXTRAS)]
+        lines.append(' '.join(part for part in parts if part))
+    return lines
+
+def single_line(lines, today):
+    timings = []
+    for line in lines:
+        begin = time.perf_counter()
+        parse_event(line, today)
+        timings.append(time.perf_counter() - begin)
+    timings.sort()
+    median = timings[len(timings) // 2] * 1e6
+    p99 = timings[int(len(timings) * 0.99)] * 1e6
+    print(f"single line ({len(lines)} lines): median {median:6.1f} us  p99 {p99:6.1f} us  "
+          f"max {timings[-1] * 1e6:7.1f} us")
+
+def batch(lines, today, repeats=5):
+    timings = []
+    for _ in range(repeats):
+        begin = time.perf_counter()
+        parse_events(lines, today)
+        timings.append(time.perf_counter() - begin)
+    best = min(timings)
+    print(f"batch of {len(lines):>6} lines: {best * 1000:8.2f} ms  ({len(lines) / best:,.0f} lines/s)")
+
+if __name__ == '__main__':
+    today = date(2025, 5, 5)
+    print("Quick-add parser benchmark")
+    lines = make_lines(20000)
+    single_line(lines, today)
+    for count in (1000, 10000):
+        batch(lines[:count], today)
@@ -0,0 +1,56 @@
+import sys
+import os
+import random
+import time
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the app package sets up the database module; no connection is made
+os.environ.setdefault('MONGO_URI', 'mongodb://localhost:27017')
+
+from app.scheduler import schedule_tasks
+
+def make_inputs(task_count, busy_count, days, seed=42):
+    """Build a random batch of tasks and busy intervals."""
+    rng = random.Random(seed)
+    start = datetime(2025, 5, 5, 8, 0)
+    tasks = [
+        {
+            'id': str(i),
+            'task_name': f"Task {i}",
+            'duration': rng.choice([15, 30, 45, 60, 90, 120]),
+            'priority': rng.randint(1, 5),
+            'due_date': (start + timedelta(days=rng.randint(1, days))).date().isoformat()
+        }
+        for i in range(task_count)
+    ]
+    busy = []
+    for _ in range(busy_count):
+        busy_start = start + timedelta(minutes=rng.randrange(0, days * 24 * 60, 15))
+        busy.append((busy_start, busy_start + timedelta(minutes=rng.choice([30, 60, 90]))))
+    return tasks, busy, start
+
+def run(task_count, busy_count, days, repeats=5):
+    tasks, busy, start = make_inputs(task_count, busy_count, days)
+
+    timings = []
+    for _ in range(repeats):
+        begin = time.perf_counter()
+        result = schedule_tasks(tasks, busy, start=start, time_budget_ms=0, use_cache=False)
+        timings.append(time.perf_counter() - begin)
+
+    # Prime the memo cache, then time a repeat of the same request
+    schedule_tasks(tasks, busy, start=start)
+    begin = time.perf_counter()
+    schedule_tasks(tasks, busy, start=start)
+    cached = time.perf_counter() - begin
+
+    print(f"{task_count:>6} tasks {busy_count:>5} busy {days:>3} days: "
+          f"greedy {min(timings) * 1000:8.2f} ms  "
+          f"placed {len(result['scheduled']):>6}  "
+          f"cached repeat {cached * 1000:6.2f} ms")
+
+if __name__ == '__main__':
+    print("Scheduler benchmark (best of 5, greedy pass only)")
+    for task_count in (100, 500, 1000, 5000):
+        run(task_count, busy_count=task_count // 2, days=60)
@@ -0,0 +1,76 @@
+import multiprocessing
+import os
+import shutil
+
+# Production server settings: gunicorn -c gunicorn.conf.py run:app
+#
+# The app is loaded once in the master (preload_app) so startup work such as
+# index checks and bcrypt calibration runs once, then forked into workers. Each
+# worker opens its own MongoDB connection pool after the fork.
+
+bind = os.getenv('BIND', '0.0.0.0:5001')
+workers = int(os.getenv('WEB_WORKERS', str(multiprocessing.cpu_count() * 2 + 1)))
+
+# gevent keeps idle /api/events/stream connections cheap; use "sync" or
+# "gthread" when the stream is not needed
+worker_class = os.getenv('WORKER_CLASS', 'gevent')
+worker_connections = int(os.getenv('WORKER_CONNECTIONS', '1000'))
+threads = int(os.getenv('WORKER_THREADS', '1'))
+
+# Every worker must see every other worker's writes for the event stream to be
+# complete, so the in-process hub only works with a single worker
+os.environ.setdefault('EVENT_HUB', 'mongo')
+if os.environ['EVENT_HUB'] == 'local' and workers > 1:
+    raise RuntimeError("EVENT_HUB=local only reaches one worker's streams; use EVENT_HUB=mongo or WEB_WORKERS=1")
+
+preload_app = True
+
+# Recycle workers now and then to contain slow leaks; jitter avoids restarting
+# them all at once
+max_requests = int(os.getenv('MAX_REQUESTS', '10000'))
+max_requests_jitter = int(os.getenv('MAX_REQUESTS_JITTER', '1000'))
+
+# Workers get this long to finish in-flight requests on reload or shutdown
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', '30'))
+# A worker that stops checking in with the master for this long is killed and
+# replaced. gevent and gthread workers check in from their own loop, so open
+# event streams don't count against it; a sync worker is busy for as long as
+# its one request runs.
+timeout = int(os.getenv('WORKER_TIMEOUT', '30'))
+keepalive = 5
+
+# Log the path without its query string: URLs may carry stream tickets and
+# search text
+accesslog = '-'
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(m)s %(U)s %(H)s" %(s)s %(b)s "%(a)s"'
+errorlog = '-'
+
+# Workers share metrics through files in this directory; it has to exist
+# before prometheus_client is imported, i.e. before the app is loaded
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join('/tmp', f'scheduler-metrics-{os.getpid()}'))
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+# gevent must patch the standard library before the app is imported, which
+# with preload_app happens in the master right after this file is read
+if worker_class == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+def when_ready(server):
+    # The master may have connected while loading the app; drop that pool so
+    # no sockets are shared with the workers
+    from app.database import close_client
+    close_client()
+
+def post_fork(server, worker):
+    from app.database import close_client
+    close_client()
+    server.log.info(f"Worker {worker.pid} will connect to MongoDB on first use")
+
+def child_exit(server, worker):
+    # Keep the dead worker's counters but drop its live gauges
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+def on_exit(server):
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
@@ -1,7 +1,8 @@
 import React from 'react';
 import '../styles/Calendar.css';
 
-const Calendar = ({ tasks = [] }) => {
+// `summary` holds the buckets from /api/events/summary?granularity=day for this month
+const Calendar = ({ summary = [] }) => {
   const getDaysInMonth = (year, month) => {
     return new Date(year, month + 1, 0).getDate();
   };
@@ -18,10 +19,11 @@ const Calendar = ({ tasks = [] }) => {
   const daysInMonth = getDaysInMonth(currentYear, currentMonth);
   const firstDayOfMonth = getFirstDayOfMonth(currentYear, currentMonth);
 
-  // Function to get tasks for a specific day
-  const getTasksForDay = (day) => {
-    return tasks.filter(task => task.day === day);
-  };
+  // Day of the month -> { total, top } from the server-side summary
+  const bucketsByDay = {};
+  summary.forEach(bucket => {
+    bucketsByDay[new Date(bucket.start).getDate()] = bucket;
+  });
 
   const renderCalendarDays = () => {
     const days = [];
@@ -34,8 +36,9 @@ const Calendar = ({ tasks = [] }) => {
 
     // Add the days of the month
     for (let day = 1; day <= daysInMonth; day++) {
-      const dayTasks = getTasksForDay(day);
-      const hasTasks = dayTasks.length > 0;
+      const bucket = bucketsByDay[day];
+      const total = bucket ? bucket.total : 0;
+      const hasTasks = total > 0;
       
       days.push(
         <div 
@@ -45,15 +48,15 @@ const Calendar = ({ tasks = [] }) => {
           <div className="day-number">{day}</div>
           {hasTasks && (
             <div className="day-tasks">
-              {dayTasks.slice(0, 2).map(task => (
+              {bucket.top.slice(0, 2).map((task, index) => (
                 <div 
-                  key={task.id} 
+                  key={index} 
                   className={`task-dot task-${task.priority}`}
                   title={task.title}
                 ></div>
               ))}
-              {dayTasks.length > 2 && (
-                <div className="more-tasks">+{dayTasks.length - 2}</div>
+              {total > 2 && (
+                <div className="more-tasks">+{total - 2}</div>
               )}
             </div>
           )}
@@ -70,6 +70,15 @@ export const AuthProvider = ({ children }) => {
 
   // Logout user
   const logout = () => {
+    // Revoke the token on the server; the local session is cleared either way
+    const token = localStorage.getItem('token');
+    if (token) {
+      fetch('http://localhost:5001/api/logout', {
+        method: 'POST',
+        headers: { 'Authorization': `Bearer ${token}` }
+      }).catch(err => console.error('Error revoking token:', err));
+    }
+    localStorage.removeItem('token');
     localStorage.removeItem('user');
     setCurrentUser(null);
   };
@@ -14,6 +14,7 @@ const Input = () => {
     category: 'work'
   });
   const [error, setError] = useState('');
+  const [quickText, setQuickText] = useState('');
 
   const handleChange = (e) => {
     const { name, value } = e.target;
@@ -23,6 +24,42 @@ const Input = () => {
     }));
   };
 
+  // Fill in the form from a line like "lunch with Bob tomorrow 1pm for 45m #personal !high"
+  const handleQuickAdd = async (e) => {
+    e.preventDefault();
+    setError('');
+    if (!quickText.trim()) return;
+
+    try {
+      const response = await fetch('http://localhost:5001/api/events/parse', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${localStorage.getItem('token')}`
+        },
+        body: JSON.stringify({
+          text: quickText,
+          // Relative dates like "tomorrow" are resolved against the local date
+          today: new Date().toLocaleDateString('en-CA')
+        }),
+      });
+
+      const data = await response.json();
+
+      if (response.ok) {
+        setFormData(prevData => ({
+          ...prevData,
+          ...data.event
+        }));
+      } else {
+        setError(data.error || 'Could not understand that');
+      }
+    } catch (err) {
+      setError('An error occurred while reading the event');
+      console.error('Error parsing event:', err);
+    }
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     setError('');
@@ -40,7 +77,10 @@ const Input = () => {
           date: formData.date,
           time: formData.time,
           priority: formData.priority,
-          category: formData.category
+          category: formData.category,
+          // Only set by quick add
+          duration: formData.duration,
+          rrule: formData.rrule
         }),
       });
 
@@ -71,6 +111,20 @@ const Input = () => {
         
         {error && <div className="error-message">{error}</div>}
         
+        <form className="input-form" onSubmit={handleQuickAdd}>
+          <div className="form-group">
+            <label htmlFor="quick">Quick Add</label>
+            <input
+              type="text"
+              id="quick"
+              name="quick"
+              value={quickText}
+              onChange={(e) => setQuickText(e.target.value)}
+              placeholder="e.g. lunch with Bob tomorrow 1pm for 45m #personal !high"
+            />
+          </div>
+        </form>
+        
         <form className="input-form" onSubmit={handleSubmit}>
           <div className="form-group">
             <label htmlFor="title">Event Title</label>
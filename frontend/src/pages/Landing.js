@@ -10,6 +10,7 @@ const Landing = () => {
   const navigate = useNavigate();
   const [currentTime, setCurrentTime] = useState('');
   const [events, setEvents] = useState([]);
+  const [summary, setSummary] = useState([]);
   const [error, setError] = useState('');
 
   // Update current time every minute
@@ -47,7 +48,7 @@ const Landing = () => {
       }
 
       try {
-        const response = await fetch('http://localhost:5001/api/events', {
+        const response = await fetch('http://localhost:5001/api/events?fields=summary', {
           headers: {
             'Authorization': `Bearer ${token}`
           }
@@ -66,6 +67,23 @@ const Landing = () => {
 
         const data = await response.json();
         setEvents(data);
+
+        // Per-day counts for the month grid, aggregated on the server
+        const now = new Date();
+        const monthStart = new Date(now.getFullYear(), now.getMonth(), 1).toLocaleDateString('en-CA');
+        const monthEnd = new Date(now.getFullYear(), now.getMonth() + 1, 1).toLocaleDateString('en-CA');
+        const summaryResponse = await fetch(
+          `http://localhost:5001/api/events/summary?granularity=day&start=${monthStart}&end=${monthEnd}`,
+          {
+            headers: {
+              'Authorization': `Bearer ${token}`
+            }
+          }
+        );
+        if (summaryResponse.ok) {
+          const summaryData = await summaryResponse.json();
+          setSummary(summaryData.buckets);
+        }
       } catch (err) {
         setError('Error loading events');
         console.error('Error fetching events:', err);
@@ -73,15 +91,47 @@ const Landing = () => {
     };
 
     fetchEvents();
-  }, [navigate]);
 
-  // Convert events to tasks format for calendar
-  const tasks = events.map(event => ({
-    id: event.event_id,
-    title: event.title,
-    priority: event.priority,
-    day: new Date(event.date).getDate()
-  }));
+    // Refetch whenever the backend reports a change to this user's events
+    const token = localStorage.getItem('token');
+    if (!token) return;
+    let stream = null;
+    let closed = false;
+
+    // EventSource cannot send headers, so trade the token for a short-lived
+    // stream ticket; a fresh one is needed every time the stream reopens
+    const openStream = async () => {
+      try {
+        const response = await fetch('http://localhost:5001/api/events/stream/ticket', {
+          method: 'POST',
+          headers: {
+            'Authorization': `Bearer ${token}`
+          }
+        });
+        if (!response.ok || closed) return;
+        const { ticket } = await response.json();
+        stream = new EventSource(`http://localhost:5001/api/events/stream?ticket=${encodeURIComponent(ticket)}`);
+        stream.addEventListener('change', fetchEvents);
+        stream.addEventListener('resync', fetchEvents);
+        // The login expired or was revoked
+        stream.addEventListener('expired', () => stream.close());
+        stream.onerror = () => {
+          // A dropped stream would retry with the same, by then expired, ticket
+          stream.close();
+          if (!closed) setTimeout(openStream, 5000);
+        };
+      } catch (err) {
+        console.error('Error opening event stream:', err);
+      }
+    };
+    openStream();
+
+    // Close the stream on component unmount
+    return () => {
+      closed = true;
+      if (stream) stream.close();
+    };
+  }, [navigate]);
 
   return (
     <div className="page-container">
@@ -99,7 +149,7 @@ const Landing = () => {
 
         <div className="main-content">
           <div className="left-panel">
-            <Calendar tasks={tasks} />
+            <Calendar summary={summary} />
             <div className="date-display">
               <div className="date-label">Current Time</div>
               <div className="date-value">{currentTime}</div>